@@ -1,369 +1,1202 @@
-import pandas as pd
 import os
-import plotly.io as pio
-import plotly.graph_objects as go
+import atexit
+import collections
+import csv
+import hashlib
+import importlib.util
+import json
+import logging
+import pickle
+import threading
+import time
+import warnings
+
+import metrics
+import response_cache
+import shared_data
+import startup
+from startup import lazy_import
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
 import dash_table
-from dash.dependencies import Input, Output
+from dash import Patch, callback_context
+from dash.dependencies import ClientsideFunction, Input, Output
+
+startup.checkpoint("import dash")
+
+# numpy and pandas are only imported once a scenario is first loaded
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+from prepare import (
+    METRICS,
+    baseline_levels,
+    calc_changes,
+    group_metrs,
+    load_registry,
+    load_scenario,
+    weighted_totals,
+)
 
 external_stylesheets = ["https://codepen.io/chriddyp/pen/bWLwgP.css"]
 
 CURR_PATH = os.path.abspath(os.path.dirname(__file__))
 
 
-def calc_overall_treat(df, var):
+# registry of policy scenarios (see prepare.py and data/scenarios.json)
+REGISTRY = load_registry()
+SCENARIOS = REGISTRY["scenarios"]
+# current law, which the tables and bubble sizes are measured against
+BASELINE = REGISTRY["baseline"]
+DEFAULT_SCENARIOS = tuple(REGISTRY["default"])
+# number of scenarios whose prepared data is held in memory at once
+SCENARIO_CACHE_SIZE = int(os.environ.get("SCENARIO_CACHE_SIZE", "8"))
+# "full" keeps strings as objects and numbers as 64-bit; "compact" stores
+# strings as categoricals, asset sizes as float32, and years as small
+# ints, using less memory per worker; "shared" stores them like "compact"
+# in memory-mapped files that every worker maps instead of copying
+FRAME_STORAGE = os.environ.get("FRAME_STORAGE", "full")
+# optional JSON file of custom groupings of assets and industries, shown
+# as extra rows of the tables
+GROUPINGS_PATH = os.environ.get("GROUPINGS_PATH")
+
+
+def column_values(path, column):
     """
-    Overall tax treatment is calculated by taking a weighted average
-    of corporate and non-corporate METRs (weighted by asset size)
+    distinct values of one column of a CSV file, read without pandas
     """
-    for mettr in ["mettr_d", "mettr_e", "mettr_mix"]:
-        mettr_tot = mettr + "_tot"
-        mettr_ovr = mettr + "_ovr"
-        df[mettr_tot] = df["assets"] * df[mettr]
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        i = next(reader).index(column)
+        return {row[i] for row in reader}
 
-        # group by by asset/industry, year, and policy
-        g = df.groupby([var, "year", "policy"])
-        # calculate weighted average of corporate/non-corporate METRs
-        sr = g.apply(lambda x: x[mettr_tot].sum()) / g.apply(
-            lambda x: x["assets"].sum()
-        )
-        # total size of asset
-        sr_size = g.apply(lambda x: x["assets"].sum())
 
-        df = pd.merge(
-            df, sr.to_frame().rename(columns={0: mettr_ovr}), on=[var, "year", "policy"]
+def load_groupings(path, scenario=None):
+    """
+    custom groupings by tab: a dict of group name -> member names for each
+    of "asset_tab" and "industry_tab"
+    raises ValueError for any other tab, for groups that are not lists of
+    names, and for group names that are also asset or industry names of
+    scenario, which the tables could not tell apart from them
+    """
+    groupings = {"asset_tab": {}, "industry_tab": {}}
+    if not path:
+        return groupings
+    with open(path) as f:
+        loaded = json.load(f)
+    unknown = set(loaded).difference(groupings)
+    if unknown:
+        raise ValueError(
+            "unknown tabs in {}: {}".format(path, ", ".join(sorted(unknown)))
         )
+    groupings.update(loaded)
+    for tab, (var, key) in {
+        "asset_tab": ("asset_name", "asset_path"),
+        "industry_tab": ("Industry", "industry_path"),
+    }.items():
+        groups = groupings[tab]
+        if not isinstance(groups, dict) or not all(
+            isinstance(members, list) for members in groups.values()
+        ):
+            raise ValueError(
+                "{} of {} is not a dict of group name -> members".format(tab, path)
+            )
+        if scenario is None or not groups:
+            continue
+        clash = set(groups).intersection(column_values(scenario[key], var))
+        if clash:
+            raise ValueError(
+                "group names in {} are also {} names: {}".format(
+                    path, var, ", ".join(sorted(clash))
+                )
+            )
+    return groupings
 
-        df = pd.merge(
-            df,
-            sr_size.to_frame().rename(columns={0: "assets_ovr"}),
-            on=[var, "year", "policy"],
-        )
-    return df.sort_values("assets_ovr")
 
+# checked against the baseline once, so a bad file fails at startup
+GROUPINGS = load_groupings(GROUPINGS_PATH, SCENARIOS[BASELINE])
 
-# read Cost-of-Capital-Calculator output
-# combine current law and Biden results
-# by asset...
-base_asset_path = os.path.join(CURR_PATH, "data/baseline_results_assets.csv")
-base_asset_df = pd.read_csv(base_asset_path)
-base_asset_df["policy"] = "base"
+startup.checkpoint("load scenario registry")
 
-biden_asset_path = os.path.join(CURR_PATH, "data/biden_results_assets.csv")
-biden_asset_df = pd.read_csv(biden_asset_path)
-biden_asset_df["policy"] = "biden"
 
-asset_df_all = pd.concat([base_asset_df, biden_asset_df])
+def make_index(df, keys):
+    """
+    partition df by the key columns so that filtering on them is a dict
+    lookup instead of a boolean-mask scan over the whole table
+    rows keep their original order within each partition
+    the partitions are slices of one read-only copy of df with the rows of
+    each partition next to each other, which threads can share
+    """
+    groups = df.groupby(keys, sort=False, observed=True).indices
+    if not groups:
+        return {}
+    groups = sorted(groups.items(), key=lambda item: item[1][0])
+    frame = shared_data.read_only_frame(
+        df.take(np.concatenate([rows for _, rows in groups]))
+    )
+    index, start = {}, 0
+    for key, rows in groups:
+        index[key] = frame.iloc[start : start + len(rows)]
+        start += len(rows)
+    return index
 
-asset_df_all = calc_overall_treat(asset_df_all, "asset_name")
 
-# create separate dataframe for overall tax treatment
-asset_df_overall = pd.DataFrame()
-asset_df_overall["asset_name"] = asset_df_all["asset_name"]
-asset_df_overall["assets"] = asset_df_all["assets_ovr"]
-asset_df_overall["mettr_d"] = asset_df_all["mettr_d_ovr"]
-asset_df_overall["mettr_e"] = asset_df_all["mettr_e_ovr"]
-asset_df_overall["mettr_mix"] = asset_df_all["mettr_mix_ovr"]
-asset_df_overall["tax_treat"] = "overall"
-asset_df_overall["year"] = asset_df_all["year"]
-asset_df_overall["policy"] = asset_df_all["policy"]
+def lookup(index, key, empty):
+    """
+    return the partition for key, or the empty frame
+    """
+    return index.get(key, empty)
 
-asset_df_all = asset_df_all.drop(
-    [
-        "Unnamed: 0",
-        "metr_d",
-        "metr_e",
-        "metr_mix",
-        "z_mix",
-        "assets_ovr",
-        "assets_ovr_x",
-        "assets_ovr_y",
-        "mettr_d_tot",
-        "mettr_e_tot",
-        "mettr_mix_tot",
-        "mettr_d_ovr",
-        "mettr_e_ovr",
-        "mettr_mix_ovr",
-    ],
-    axis=1,
-)
-# stack original df and overall tax treatment df
-asset_df = pd.concat([asset_df_all, asset_df_overall])
-
-# combine current law and Biden results
-# by industry...
-base_industry_path = os.path.join(CURR_PATH, "data/baseline_byindustry.csv")
-base_industry_df = pd.read_csv(base_industry_path)
-base_industry_df["policy"] = "base"
-
-biden_industry_path = os.path.join(CURR_PATH, "data/biden_industry_results.csv")
-biden_industry_df = pd.read_csv(biden_industry_path)
-biden_industry_df["policy"] = "biden"
-
-industry_df_all = pd.concat([base_industry_df, biden_industry_df])
-# only include major_industries
-industry_df_all = industry_df_all.loc[
-    (industry_df_all["Industry"] == industry_df_all["major_industry"])
-]
 
-industry_df_all = calc_overall_treat(industry_df_all, "Industry")
-
-# create separate dataframe for overall tax treatment
-industry_df_overall = pd.DataFrame()
-industry_df_overall["Industry"] = industry_df_all["Industry"]
-industry_df_overall["major_industry"] = industry_df_all["major_industry"]
-industry_df_overall["assets"] = industry_df_all["assets_ovr"]
-industry_df_overall["mettr_d"] = industry_df_all["mettr_d_ovr"]
-industry_df_overall["mettr_e"] = industry_df_all["mettr_e_ovr"]
-industry_df_overall["mettr_mix"] = industry_df_all["mettr_mix_ovr"]
-industry_df_overall["tax_treat"] = "overall"
-industry_df_overall["year"] = industry_df_all["year"]
-industry_df_overall["policy"] = industry_df_all["policy"]
-industry_df_overall.drop_duplicates(inplace=True)
-
-industry_df_all = industry_df_all.drop(
-    [
-        "Unnamed: 0",
-        "bea_ind_code",
-        "major_industry",
-        "metr_d",
-        "metr_e",
-        "metr_mix",
-        "z_mix",
-        "assets_ovr",
-        "assets_ovr_x",
-        "assets_ovr_y",
-        "mettr_d_ovr",
-        "mettr_e_ovr",
-        "mettr_mix_ovr",
-        "mettr_d_tot",
-        "mettr_e_tot",
-        "mettr_mix_tot",
-    ],
-    axis=1,
-)
-# stack original df and overall tax treatment df
-industry_df = pd.concat([industry_df_all, industry_df_overall])
-
-
-def make_fig(year, tax_treat, financing):
-    """
-    function to make Plotly figure
-    will be called in app callback
-    """
-
-    def make_data(pol, year, tax_treat):
-        """
-        filter data by policy, year, and tax treatment
-        omit 'overall' asset type because it messes with the bubble scaling
-        """
-        asset_data = asset_df.loc[
-            (asset_df["asset_name"] != "Overall")
-            & (asset_df["policy"] == pol)
-            & (asset_df["year"] == year)
-            & (asset_df["tax_treat"] == tax_treat)
-        ]
-
-        industry_data = industry_df.loc[
-            (industry_df["Industry"] != "Overall")
-            & (industry_df["policy"] == pol)
-            & (industry_df["year"] == year)
-            & (industry_df["tax_treat"] == tax_treat)
-        ]
-
-        return asset_data, industry_data
-
-    def make_tables(tax_treat, financing):
-        """
-        prepare tables for raw data shown below plots
-        """
-        asset_table_base = asset_df.loc[
-            (asset_df["policy"] == "base") & (asset_df["tax_treat"] == tax_treat)
-        ]
-        asset_table_base = asset_table_base.pivot_table(
-            index="asset_name", columns="year", values=financing
+def metr_extents(df, keys):
+    """
+    smallest and largest value of each METR column of df by keys, over all
+    years, so that the x-axis of a figure can stay fixed across years
+    """
+    columns = [
+        metr + measure["suffix"]
+        for metr in METRICS
+        for measure in MEASURES.values()
+        if metr + measure["suffix"] in df.columns
+    ]
+    grouped = df.groupby(keys, sort=False, observed=True)[columns]
+    lows, highs = grouped.min(), grouped.max()
+    return {
+        key: {
+            col: (float(lows.at[key, col]), float(highs.at[key, col]))
+            for col in columns
+        }
+        for key in lows.index
+    }
+
+
+def index_scenario(asset_df, industry_df, baseline=None):
+    """
+    partition the frames of one scenario for make_data and make_table
+    bubble data is keyed by (tax_treat, year) without the 'Overall' rows,
+    table data by tax_treat
+    the industry tab shows the major industries; the rows of each major
+    industry and of the detailed industries within it are keyed by
+    (tax_treat, major_industry), so drilling down is a dict lookup
+    the totals of each tab are the operand of custom groupings, and the
+    extents of the bubble data set the x-axis ranges of the figures
+    baseline is the indexed baseline when indexing a reform: the change of
+    every row from the baseline is added before partitioning, so the
+    changes share the partitions of the values; the baseline keeps its
+    values by asset or industry, tax_treat, and year for that
+    only the partitions are kept, so the frames can be freed; what is kept
+    is read-only, so that threads serving requests can share it
+    """
+    if baseline is not None:
+        asset_df = calc_changes(asset_df, baseline["asset_tab"]["levels"], "asset_name")
+        industry_df = calc_changes(
+            industry_df, baseline["industry_tab"]["levels"], "Industry"
         )
-        asset_table_base = round(asset_table_base.reset_index(), 3)
-        asset_table_base.rename(columns={"asset_name": "Asset"}, inplace=True)
-
-        asset_table_biden = asset_df.loc[
-            (asset_df["policy"] == "biden") & (asset_df["tax_treat"] == tax_treat)
-        ]
-        asset_table_biden = asset_table_biden.pivot_table(
-            index="asset_name", columns="year", values=financing
+    level = industry_df["level"]
+    majors = industry_df[level != "detailed"]
+    detailed = industry_df[level == "detailed"]
+    assets = asset_df[asset_df["asset_name"] != "Overall"]
+    majors_data = majors[majors["Industry"] != "Overall"]
+    data = {
+        "asset_tab": {
+            "empty": shared_data.read_only_frame(asset_df.iloc[:0]),
+            "data_index": make_index(assets, ["tax_treat", "year"]),
+            "table_index": make_index(asset_df, "tax_treat"),
+            "totals": shared_data.read_only(weighted_totals(asset_df, "asset_name")),
+            "extents": metr_extents(assets, "tax_treat"),
+        },
+        "industry_tab": {
+            "empty": shared_data.read_only_frame(industry_df.iloc[:0]),
+            "data_index": make_index(majors_data, ["tax_treat", "year"]),
+            "table_index": make_index(majors, "tax_treat"),
+            "detail_index": make_index(
+                industry_df[level != "overall"], ["tax_treat", "major_industry"]
+            ),
+            # major industries that have detailed industries
+            "majors": sorted(detailed["major_industry"].unique()),
+            "totals": shared_data.read_only(weighted_totals(industry_df, "Industry")),
+            "extents": metr_extents(majors_data, "tax_treat"),
+            "detail_extents": metr_extents(detailed, ["tax_treat", "major_industry"]),
+        },
+    }
+    if baseline is None:
+        data["asset_tab"]["levels"] = shared_data.read_only_frame(
+            baseline_levels(asset_df, "asset_name")
         )
-        asset_table_biden = round(asset_table_biden.reset_index(), 3)
-        asset_table_biden.rename(columns={"asset_name": "Asset"}, inplace=True)
-
-        ind_table_base = industry_df.loc[
-            (industry_df["policy"] == "base") & (industry_df["tax_treat"] == tax_treat)
-        ]
-        ind_table_base = ind_table_base.pivot_table(
-            index="Industry", columns="year", values=financing
+        data["industry_tab"]["levels"] = shared_data.read_only_frame(
+            baseline_levels(industry_df, "Industry")
         )
-        ind_table_base = round(ind_table_base.reset_index(), 3)
+    return data
+
+
+def scenario_signature(scenario):
+    """
+    registry entry of a scenario with the size and modification time of
+    its files, which change whenever the files are rewritten
+    """
+    stats = [
+        (os.stat(path).st_size, os.stat(path).st_mtime_ns)
+        for path in [scenario["asset_path"], scenario["industry_path"]]
+    ]
+    return sorted(scenario.items()), stats
+
+
+def shared_key(scenarios, name):
+    """
+    key of the shared data of a scenario: a hash of its files and, for a
+    reform, of the baseline's files, and of the code that indexes them
+    """
+    h = hashlib.sha256()
+    for pol in dict.fromkeys([name, BASELINE]):
+        h.update(repr(scenario_signature(scenarios[pol])).encode())
+    for path in ["app.py", "prepare.py", "shared_data.py"]:
+        with open(os.path.join(CURR_PATH, path), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()[:16]
+
+
+def load_indexed(scenarios, name, baseline=None):
+    """
+    load and index the scenario name of the registry scenarios; baseline
+    is the indexed baseline when loading a reform
+    with FRAME_STORAGE=shared the indexed data is mapped from shared
+    memory, where the first process to load it writes it
+    """
 
-        ind_table_biden = industry_df.loc[
-            (industry_df["policy"] == "biden") & (industry_df["tax_treat"] == tax_treat)
-        ]
-        ind_table_biden = ind_table_biden.pivot_table(
-            index="Industry", columns="year", values=financing
+    def build():
+        compact = FRAME_STORAGE != "full"
+        return index_scenario(
+            *load_scenario(scenarios[name], compact=compact), baseline
         )
-        ind_table_biden = round(ind_table_biden.reset_index(), 3)
 
-        # Resort so that Overall row is at the top
-        asset_table_base1 = asset_table_base[asset_table_base["Asset"] == "Overall"]
-        asset_table_base2 = asset_table_base[asset_table_base["Asset"] != "Overall"]
-        asset_table_base = pd.concat([asset_table_base1, asset_table_base2])
+    if FRAME_STORAGE == "shared":
+        return shared_data.get_or_build(name, shared_key(scenarios, name), build)
+    return build()
+
+
+scenario_cache = collections.OrderedDict()
+scenario_cache_lock = threading.Lock()
+# name -> event set when the thread loading that scenario is done
+scenario_loads = {}
+
+
+def get_scenario(name):
+    """
+    indexed data of one scenario, loaded when it is first selected
+    the least recently used scenarios are evicted so that at most
+    SCENARIO_CACHE_SIZE are held in memory
+    the lock is not held while loading, so other threads keep serving the
+    loaded scenarios; threads that need the scenario being loaded wait for
+    it
+    """
+    while True:
+        with scenario_cache_lock:
+            data = scenario_cache.get(name)
+            if data is not None:
+                scenario_cache.move_to_end(name)
+                return data
+            loading = scenario_loads.get(name)
+            if loading is None:
+                loading = scenario_loads[name] = threading.Event()
+                generation = view_generation
+                break
+        loading.wait()
+
+    try:
+        baseline = get_scenario(BASELINE) if name != BASELINE else None
+        data = load_indexed(SCENARIOS, name, baseline)
+        with scenario_cache_lock:
+            # data reloaded while this load ran replaces it, like views
+            if generation == view_generation:
+                scenario_cache[name] = data
+                while len(scenario_cache) > SCENARIO_CACHE_SIZE:
+                    scenario_cache.popitem(last=False)
+    finally:
+        with scenario_cache_lock:
+            del scenario_loads[name]
+        loading.set()
+    return data
+
+
+def select_scenarios(scenarios):
+    """
+    known scenarios among those selected, in registry order
+    """
+    return tuple(name for name in SCENARIOS if name in (scenarios or ()))
+
+
+def reform_scenario(scenarios):
+    """
+    the first selected scenario other than the baseline, shown in the
+    second table, or None
+    """
+    for name in select_scenarios(scenarios):
+        if name != BASELINE:
+            return name
+    return None
 
-        asset_table_biden1 = asset_table_biden[asset_table_biden["Asset"] == "Overall"]
-        asset_table_biden2 = asset_table_biden[asset_table_biden["Asset"] != "Overall"]
-        asset_table_biden = pd.concat([asset_table_biden1, asset_table_biden2])
 
-        ind_table_base1 = ind_table_base[ind_table_base["Industry"] == "Overall"]
-        ind_table_base2 = ind_table_base[ind_table_base["Industry"] != "Overall"]
-        ind_table_base = pd.concat([ind_table_base1, ind_table_base2])
+# share of the span of the data added on each side of a figure's x-axis,
+# so that the bubbles at the edges are not cut off
+XAXIS_PADDING = 0.05
 
-        ind_table_biden1 = ind_table_biden[ind_table_biden["Industry"] == "Overall"]
-        ind_table_biden2 = ind_table_biden[ind_table_biden["Industry"] != "Overall"]
-        ind_table_biden = pd.concat([ind_table_biden1, ind_table_biden2])
 
-        return asset_table_base, asset_table_biden, ind_table_base, ind_table_biden
+def xaxis_range(scenarios, tax_treat, column, tab, industry=None):
+    """
+    x-axis range that fits the values of column in every year of the
+    plotted scenarios, so that the axis does not move when changing years
+    with industry, the range fits the detailed industries within it
+    returns None when there is nothing to plot
+    """
+    lows, highs = [], []
+    for pol in scenarios:
+        data = get_scenario(pol)[tab]
+        if industry is None:
+            extents = data["extents"].get(tax_treat)
+        else:
+            extents = data["detail_extents"].get((tax_treat, industry))
+        if extents is not None and column in extents:
+            low, high = extents[column]
+            # all-NaN columns, e.g. percent changes from zero, have no extent
+            if low == low:
+                lows.append(low)
+                highs.append(high)
+    if not lows:
+        return None
+    low, high = min(lows), max(highs)
+    pad = XAXIS_PADDING * ((high - low) or abs(high) or 1.0)
+    return [low - pad, high + pad]
+
+
+# how each measure is shown: the suffix of its column, its titles, the
+# x-axis ticks, and the hover text of the x value; changes are from the
+# baseline and only shown for reforms
+MEASURES = {
+    "level": {
+        "suffix": "",
+        "title": "Marginal Effective Tax Rates on Capital",
+        "xaxis": dict(title=dict(text="Marginal Effective Tax Rate"), tickformat="%"),
+        "hover": "METR: %{x:.1%}",
+        "table": "",
+    },
+    "diff": {
+        "suffix": "_diff",
+        "title": "Change in Marginal Effective Tax Rates on Capital",
+        "xaxis": dict(
+            title=dict(text="Change in METR from Current Law"), tickformat="+.0%"
+        ),
+        "hover": "Change in METR: %{x:+.1%}",
+        "table": " (change from current law)",
+    },
+    "pct": {
+        "suffix": "_pct",
+        "title": "Percent Change in Marginal Effective Tax Rates on Capital",
+        "xaxis": dict(
+            title=dict(text="Percent Change in METR from Current Law"),
+            tickformat="+.0f",
+            ticksuffix="%",
+        ),
+        "hover": "Change in METR: %{x:+.1f}%",
+        "table": " (percent change from current law)",
+    },
+}
 
-    asset_table_base, asset_table_biden, ind_table_base, ind_table_biden = make_tables(
-        tax_treat, financing
+
+def make_data(pol, year, tax_treat, tab, industry=None):
+    """
+    filter data by policy, year, and tax treatment for one tab
+    omit 'overall' asset type because it messes with the bubble scaling
+    with industry, the detailed industries within that major industry
+    """
+    data = get_scenario(pol)[tab]
+    with metrics.timer("filter", tab=tab, treatment=tax_treat):
+        if industry is not None:
+            # the partition is small, so selecting the year needs no index
+            part = lookup(data["detail_index"], (tax_treat, industry), data["empty"])
+            return part[(part["year"] == year) & (part["level"] == "detailed")]
+        return lookup(data["data_index"], (tax_treat, year), data["empty"])
+
+
+def make_groups(scenarios, tab, groups=None):
+    """
+    asset-weighted METRs of custom groups of assets or industries for
+    every given scenario, tax treatment, and year, with the group names in
+    the asset or industry column
+    groups maps each group name to its members and defaults to the
+    groupings of the tab in GROUPINGS
+    """
+    var = "asset_name" if tab == "asset_tab" else "Industry"
+    groups = GROUPINGS[tab] if groups is None else groups
+    frames = []
+    for pol in scenarios:
+        totals = get_scenario(pol)[tab]["totals"]
+        clash = set(groups).intersection(totals["names"])
+        if clash:
+            raise ValueError(
+                "group names are also {} names: {}".format(
+                    var, ", ".join(sorted(clash))
+                )
+            )
+        df = group_metrs(totals, groups).rename(columns={"name": var})
+        frames.append(df.assign(policy=pol))
+    return pd.concat(frames, ignore_index=True)
+
+
+def make_table(pol, tax_treat, financing, tab, industry=None, measure="level"):
+    """
+    prepare the table for raw data shown below the plot of one tab
+    with industry, the table of that major industry and the detailed
+    industries within it; otherwise the custom groups of the tab follow
+    the Overall row
+    measure "diff" or "pct" shows the change of a reform from the baseline
+    """
+    if pol is None:
+        # no reform selected
+        return pd.DataFrame()
+
+    data = get_scenario(pol)[tab]
+    with metrics.timer("filter", tab=tab, treatment=tax_treat):
+        if industry is not None:
+            key = (tax_treat, industry)
+            table = lookup(data["detail_index"], key, data["empty"])
+        else:
+            table = lookup(data["table_index"], tax_treat, data["empty"])
+    if tab == "asset_tab":
+        var, label = "asset_name", "Asset"
+    elif tab == "industry_tab":
+        var, label = "Industry", "Industry"
+    groups = list(GROUPINGS[tab]) if industry is None else []
+    if groups:
+        with metrics.timer("group", tab=tab, treatment=tax_treat):
+            rows = make_groups([pol], tab)
+            if measure != "level":
+                base = baseline_levels(make_groups([BASELINE], tab), var)
+                rows = calc_changes(rows, base, var)
+            table = pd.concat([table, rows[rows["tax_treat"] == tax_treat]])
+
+    values = financing + MEASURES[measure]["suffix"]
+    with metrics.timer("pivot", tab=tab, treatment=tax_treat):
+        table = table.pivot_table(index=var, columns="year", values=values)
+        table = round(table.reset_index(), 3)
+        table = table.rename(columns={var: label})
+
+        # Resort so that Overall (or the major industry) row is at the top,
+        # followed by the custom groups
+        top = [industry or "Overall"] + groups
+        table1 = [table[table[label] == name] for name in top]
+        table2 = table[~table[label].isin(top)]
+        return pd.concat(table1 + [table2])
+
+
+def make_tables(tax_treat, financing, reform):
+    """
+    prepare tables for raw data shown below plots
+    """
+    return (
+        make_table(BASELINE, tax_treat, financing, "asset_tab"),
+        make_table(reform, tax_treat, financing, "asset_tab"),
+        make_table(BASELINE, tax_treat, financing, "industry_tab"),
+        make_table(reform, tax_treat, financing, "industry_tab"),
     )
 
-    base_asset, base_industry = make_data("base", year, tax_treat)
-    biden_asset, biden_industry = make_data("biden", year, tax_treat)
 
-    # scale the size of the bubbles
-    sizeref = 2.0 * max(base_asset.assets / (60.0 ** 2))
+# operators of DataTable filter queries, longest spelling first
+FILTER_OPERATORS = [
+    ["ge ", ">="],
+    ["le ", "<="],
+    ["lt ", "<"],
+    ["gt ", ">"],
+    ["ne ", "!="],
+    ["eq ", "="],
+    ["contains "],
+    ["datestartswith "],
+]
+
+
+def split_filter_part(filter_part):
+    """
+    split one clause of a DataTable filter query, e.g. '{2021} >= 0.2',
+    into (column, operator, value)
+    """
+    for operator_type in FILTER_OPERATORS:
+        for operator in operator_type:
+            if operator in filter_part:
+                name_part, value_part = filter_part.split(operator, 1)
+                name = name_part[name_part.find("{") + 1 : name_part.rfind("}")]
+                value_part = value_part.strip()
+                v0 = value_part[:1]
+                if v0 and v0 == value_part[-1] and v0 in ("'", '"', "`"):
+                    value = value_part[1:-1].replace("\\" + v0, v0)
+                else:
+                    try:
+                        value = float(value_part)
+                    except ValueError:
+                        value = value_part
+                return name, operator_type[0].strip(), value
+    return None, None, None
 
-    def make_traces(base_data, biden_data, y, title):
-        """
-        creates the Plotly traces -- current law and biden data series
-        """
-        base_trace = go.Scatter(
-            x=base_data[financing],
-            y=base_data[y],
-            marker=dict(
-                size=base_data["assets"],
-                sizemode="area",
-                sizeref=sizeref,
-                color="#6495ED",
-                opacity=1,
-            ),
-            mode="markers",
-            name="Current Law",
-            hovertemplate="<b>%{y}</b><br>"
-            + "<i>Current Law</i><br><br>"
-            + "Asset Size: $%{marker.size:.3s}<br>"
-            + "METR: %{x:.1%}<extra></extra>",
-            hoverlabel=dict(bgcolor="#abc6f7"),
-        )
 
-        biden_trace = go.Scatter(
-            x=biden_data[financing],
-            y=biden_data[y],
+def filter_table(table, filter_query):
+    """
+    rows of table matching a DataTable filter query
+    clauses on unknown columns are ignored
+    """
+    if not filter_query:
+        return table
+    mask = pd.Series(True, index=table.index)
+    for filter_part in filter_query.split(" && "):
+        col, operator, value = split_filter_part(filter_part)
+        if col not in table.columns:
+            continue
+        column = table[col]
+        if operator in ("contains", "datestartswith"):
+            column = column.astype(str)
+            if operator == "contains":
+                mask &= column.str.contains(str(value), case=False, regex=False)
+            else:
+                mask &= column.str.startswith(str(value))
+            continue
+        if pd.api.types.is_numeric_dtype(column) == isinstance(value, str):
+            # text compared with a numeric column, or a number with a text
+            # column, matches nothing
+            mask &= False
+            continue
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            # names are categorical with compact storage, which only
+            # compares for equality
+            column = column.astype(object)
+        if operator == "eq":
+            mask &= column == value
+        elif operator == "ne":
+            mask &= column != value
+        elif operator == "lt":
+            mask &= column < value
+        elif operator == "le":
+            mask &= column <= value
+        elif operator == "gt":
+            mask &= column > value
+        elif operator == "ge":
+            mask &= column >= value
+    return table[mask]
+
+
+def sort_table(table, sort_by):
+    """
+    sort table by the columns of a DataTable sort_by list, keeping the
+    original order (Overall first) among ties
+    """
+    sort_by = [col for col in sort_by or [] if col["column_id"] in table.columns]
+    if not sort_by:
+        return table
+    return table.sort_values(
+        [col["column_id"] for col in sort_by],
+        ascending=[col["direction"] == "asc" for col in sort_by],
+        kind="mergesort",
+    )
+
+
+def make_traces(datas, financing, sizeref, y, measure="level"):
+    """
+    creates the Plotly traces -- one data series per (scenario, data) pair
+    traces are plain dicts of arrays, which skips validating them as
+    Plotly objects on every request
+    """
+    measure = MEASURES[measure]
+    traces = []
+    for pol, data in datas:
+        scenario = SCENARIOS[pol]
+        trace = dict(
+            type="scatter",
+            x=data[financing + measure["suffix"]].to_numpy(),
+            y=data[y].to_numpy(),
             marker=dict(
-                size=biden_data["assets"],
+                size=data["assets"].to_numpy(),
                 sizemode="area",
                 sizeref=sizeref,
-                color="#FF7F50",
+                color=scenario["color"],
                 opacity=1,
             ),
             mode="markers",
-            name="Biden 2020 Proposal",
+            name=scenario["label"],
             hovertemplate="<b>%{y}</b><br>"
-            + "<i>Biden 2020 Proposal</i><br><br>"
+            + "<i>"
+            + scenario["label"]
+            + "</i><br><br>"
             + "Asset Size: $%{marker.size:.3s}<br>"
-            + "METR: %{x:.1%}<extra></extra>",
-            hoverlabel=dict(bgcolor="#ffb396"),
+            + measure["hover"]
+            + "<extra></extra>",
+            hoverlabel=dict(bgcolor=scenario["hover_color"]),
         )
+        traces.append(trace)
+    return traces
 
-        layout = go.Layout(
-            title="Marginal Effective Tax Rates on Capital by " + title,
-            xaxis=dict(
-                title="Marginal Effective Tax Rate",
-                gridcolor="#f2f2f2",
-                tickformat="%",
-                #         range=[-0.15,0.3]
-            ),
+
+# static part of the layout of each tab's figure, built on first use
+layout_templates = {}
+
+
+def layout_template(tab):
+    """
+    layout shared by the figures of one tab, including the default Plotly
+    template that plotly.graph_objects.Figure would add, so that the
+    figures look the same
+    """
+    template = layout_templates.get(tab)
+    if template is None:
+        import plotly.io as pio
+
+        template = layout_templates[tab] = dict(
+            template=pio.templates[pio.templates.default].to_plotly_json(),
+            xaxis=dict(gridcolor="#f2f2f2"),
             yaxis=dict(gridcolor="#f2f2f2", type="category"),
             # paper_bgcolor="#F9F9F9",
             plot_bgcolor="white",
             width=1100,
         )
+        if tab == "asset_tab":
+            template.update(legend=dict(orientation="h", x=-0.15, y=1.05), height=500)
+        else:
+            template.update(legend=dict(orientation="h", x=-0.35, y=1.05), height=700)
+    return template
+
+
+def make_layout(tab, title, measure="level", xaxis_range=None):
+    """
+    layout of one tab's figure: the template with the title and x-axis of
+    the measure
+    """
+    template = layout_template(tab)
+    measure = MEASURES[measure]
+    xaxis = dict(template["xaxis"], **measure["xaxis"])
+    if xaxis_range is not None:
+        xaxis["range"] = xaxis_range
+    return dict(
+        template, title=dict(text=measure["title"] + " by " + title), xaxis=xaxis
+    )
+
+
+def make_year_frames(
+    tax_treat, financing, tab, scenarios, industry=None, measure="level"
+):
+    """
+    animation frames of one tab, one per year, named by the year
+    frames only carry what changes between years: the x and y values and
+    the bubble sizes and scale of each scenario's trace
+    """
+    y = "asset_name" if tab == "asset_tab" else "Industry"
+    frames = []
+    for year in YEARS:
+        base_asset = make_data(BASELINE, year, tax_treat, "asset_tab")
+        sizeref = 2.0 * max(base_asset.assets / (60.0 ** 2))
+        traces = []
+        for pol in scenarios:
+            data = make_data(pol, year, tax_treat, tab, industry)
+            traces.append(
+                dict(
+                    type="scatter",
+                    x=data[financing + MEASURES[measure]["suffix"]].to_numpy(),
+                    y=data[y].to_numpy(),
+                    marker=dict(size=data["assets"].to_numpy(), sizeref=sizeref),
+                )
+            )
+        frames.append(dict(name=str(year), data=traces))
+    return frames
+
+
+def year_controls(year):
+    """
+    slider and play button of an animated figure, which step through the
+    year frames in the browser
+    """
+    jump = dict(
+        mode="immediate",
+        frame=dict(duration=0, redraw=False),
+        transition=dict(duration=0),
+    )
+    play = dict(
+        fromcurrent=True,
+        frame=dict(duration=800, redraw=False),
+        transition=dict(duration=400, easing="cubic-in-out"),
+    )
+    sliders = [
+        dict(
+            active=YEARS.index(year),
+            currentvalue=dict(prefix="Year: "),
+            x=0.1,
+            len=0.9,
+            pad=dict(t=60),
+            steps=[
+                dict(method="animate", label=str(y), args=[[str(y)], jump])
+                for y in YEARS
+            ],
+        )
+    ]
+    updatemenus = [
+        dict(
+            type="buttons",
+            direction="left",
+            showactive=False,
+            x=0.1,
+            y=0,
+            xanchor="right",
+            yanchor="top",
+            pad=dict(t=70, r=10),
+            buttons=[
+                dict(label="Play", method="animate", args=[None, play]),
+                dict(label="Pause", method="animate", args=[[None], jump]),
+            ],
+        )
+    ]
+    return sliders, updatemenus
 
-        fig = go.Figure(data=[base_trace, biden_trace], layout=layout)
-        return fig
-
-    fig_asset = make_traces(base_asset, biden_asset, "asset_name", "Asset")
-    fig_asset.update_layout(legend_orientation="h", legend=dict(x=-0.15, y=1.05))
-
-    fig_industry = make_traces(base_industry, biden_industry, "Industry", "Industry")
-    fig_industry.update_layout(legend_orientation="h", legend=dict(x=-0.35, y=1.05))
-
-    fig_asset.layout.height = 500
-    fig_industry.layout.height = 700
-
-    # fix the x-axis when changing years for asset fig
-    if financing == "mettr_e" and tax_treat == "corporate":
-        fig_asset.layout.xaxis.range = [-0.05, 0.5]
-    elif financing == "mettr_e" and tax_treat == "non-corporate":
-        fig_asset.layout.xaxis.range = [-0.2, 0.38]
-    elif financing == "mettr_d" and tax_treat == "corporate":
-        fig_asset.layout.xaxis.range = [-0.45, 0.38]
-    elif financing == "mettr_d" and tax_treat == "non-corporate":
-        fig_asset.layout.xaxis.range = [-0.22, 0.42]
-    elif financing == "mettr_mix" and tax_treat == "corporate":
-        fig_asset.layout.xaxis.range = [-0.07, 0.45]
-    elif financing == "mettr_mix" and tax_treat == "non-corporate":
-        fig_asset.layout.xaxis.range = [-0.20, 0.37]
-    elif financing == "mettr_d" and tax_treat == "overall":
-        fig_asset.layout.xaxis.range = [-0.40, 0.42]
-    elif financing == "mettr_mix" and tax_treat == "overall":
-        fig_asset.layout.xaxis.range = [-0.08, 0.45]
-    elif financing == "mettr_e" and tax_treat == "overall":
-        fig_asset.layout.xaxis.range = [-0.05, 0.45]
-
-    # fix the x-axis when changing years for industry fig
-    if financing == "mettr_e" and tax_treat == "corporate":
-        fig_industry.layout.xaxis.range = [0.1, 0.5]
-    elif financing == "mettr_e" and tax_treat == "non-corporate":
-        fig_industry.layout.xaxis.range = [0.0, 0.35]
-    elif financing == "mettr_d" and tax_treat == "corporate":
-        fig_industry.layout.xaxis.range = [-0.1, 0.3]
-    elif financing == "mettr_d" and tax_treat == "non-corporate":
-        fig_industry.layout.xaxis.range = [0.05, 0.4]
-    elif financing == "mettr_mix" and tax_treat == "corporate":
-        fig_industry.layout.xaxis.range = [0.07, 0.45]
-    elif financing == "mettr_mix" and tax_treat == "non-corporate":
-        fig_industry.layout.xaxis.range = [0.0, 0.35]
-    elif financing == "mettr_d" and tax_treat == "overall":
-        fig_industry.layout.xaxis.range = [-0.10, 0.33]
-    elif financing == "mettr_mix" and tax_treat == "overall":
-        fig_industry.layout.xaxis.range = [0.08, 0.43]
-    elif financing == "mettr_e" and tax_treat == "overall":
-        fig_industry.layout.xaxis.range = [0.1, 0.45]
+
+def make_tab_fig(
+    year,
+    tax_treat,
+    financing,
+    tab,
+    scenarios=DEFAULT_SCENARIOS,
+    animate=False,
+    industry=None,
+    measure="level",
+):
+    """
+    make the Plotly figure shown on one tab, with a series per scenario,
+    as a plain dict
+    with animate, the figure also holds a frame for every year and a
+    slider and play button to move between them without a server request
+    with industry, the industry tab shows the detailed industries within
+    that major industry
+    measure "diff" or "pct" shows the change of each reform from the
+    baseline, leaving out the baseline itself
+    """
+    # scale the size of the bubbles
+    base_asset = make_data(BASELINE, year, tax_treat, "asset_tab")
+    sizeref = 2.0 * max(base_asset.assets / (60.0 ** 2))
+
+    if measure != "level":
+        scenarios = [pol for pol in scenarios if pol != BASELINE]
+    datas = [(pol, make_data(pol, year, tax_treat, tab, industry)) for pol in scenarios]
+
+    with metrics.timer("figure", tab=tab, treatment=tax_treat):
+        if tab == "asset_tab":
+            y, title = "asset_name", "Asset"
+        else:
+            y = "Industry"
+            title = "Industry" if industry is None else "Industry: " + industry
+        # fix the x-axis when changing years
+        column = financing + MEASURES[measure]["suffix"]
+        layout = make_layout(
+            tab,
+            title,
+            measure,
+            xaxis_range(scenarios, tax_treat, column, tab, industry),
+        )
+        fig = dict(
+            data=make_traces(datas, financing, sizeref, y, measure), layout=layout
+        )
+
+        if animate:
+            fig["frames"] = make_year_frames(
+                tax_treat, financing, tab, scenarios, industry, measure
+            )
+            sliders, updatemenus = year_controls(year)
+            # make room for the slider below the x-axis
+            layout.update(
+                sliders=sliders,
+                updatemenus=updatemenus,
+                margin=dict(b=160),
+                height=layout["height"] + 80,
+            )
+
+    return fig
+
+
+def make_fig(year, tax_treat, financing, scenarios=DEFAULT_SCENARIOS, animate=False):
+    """
+    function to make the Plotly figures and tables for both tabs
+    the tables show the baseline and the first selected reform
+    with animate, the figures hold a frame for every year and start at year
+    """
+    scenarios = select_scenarios(scenarios)
+    fig_asset = make_tab_fig(
+        year, tax_treat, financing, "asset_tab", scenarios, animate
+    )
+    fig_industry = make_tab_fig(
+        year, tax_treat, financing, "industry_tab", scenarios, animate
+    )
+    asset_table_base, asset_table_reform, ind_table_base, ind_table_reform = make_tables(
+        tax_treat, financing, reform_scenario(scenarios)
+    )
 
     return (
         fig_asset,
         fig_industry,
         asset_table_base,
-        asset_table_biden,
+        asset_table_reform,
         ind_table_base,
-        ind_table_biden,
+        ind_table_reform,
     )
 
 
+# every input combination the dashboard can request
+YEARS = list(range(2021, 2031))
+FINANCING = ["mettr_mix", "mettr_e", "mettr_d"]
+TREATMENTS = ["overall", "corporate", "non-corporate"]
+TABS = ["asset_tab", "industry_tab"]
+# labels of the inputs above in the page and in exported views
+FINANCING_LABELS = {
+    "mettr_mix": "Typically Financed",
+    "mettr_e": "Equity",
+    "mettr_d": "Debt",
+}
+TREATMENT_LABELS = {
+    "overall": "Overall",
+    "corporate": "Corporate",
+    "non-corporate": "Non-Corporate",
+}
+TAB_LABELS = {"asset_tab": "Asset", "industry_tab": "Industry"}
+
+# view cache settings: "lazy" fills a bounded LRU on demand, "eager"
+# materializes every view at startup, and "off" rebuilds on each request
+VIEW_CACHE = os.environ.get("VIEW_CACHE", "lazy")
+# by default large enough to hold every figure and table view of the
+# default scenario selection
+VIEW_CACHE_SIZE = int(
+    os.environ.get(
+        "VIEW_CACHE_SIZE",
+        (len(YEARS) + 1) * len(FINANCING) * len(TREATMENTS) * len(TABS),
+    )
+)
+# optional pickle file used to persist views across worker restarts
+VIEW_CACHE_PATH = os.environ.get("VIEW_CACHE_PATH")
+
+
+def make_figure_view(
+    year, financing, treatment, tab, scenarios, industry=None, measure="level"
+):
+    """
+    build the figure shown on one tab
+    figures are plain dicts so views can be pickled and shared
+    """
+    return make_tab_fig(
+        year, treatment, financing, tab, scenarios, False, industry, measure
+    )
+
+
+def make_animation_view(
+    financing, treatment, tab, scenarios, industry=None, measure="level"
+):
+    """
+    build the figure shown on one tab with a frame for every year,
+    starting at the first year
+    """
+    return make_tab_fig(
+        YEARS[0], treatment, financing, tab, scenarios, True, industry, measure
+    )
+
+
+def make_table_view(financing, treatment, tab, reform, industry=None, measure="level"):
+    """
+    build the columns and records of the baseline and reform tables, and
+    the title of the reform table
+    tables cover every year, so they do not depend on the year slider
+    the reform table shows the measure; the baseline table its values
+    """
+    table_base = make_table(BASELINE, treatment, financing, tab, industry)
+    table_reform = make_table(reform, treatment, financing, tab, industry, measure)
+    columns = [{"name": str(i), "id": str(i)} for i in table_base.columns]
+    title = ""
+    if reform is not None:
+        title = "##### " + SCENARIOS[reform]["label"] + MEASURES[measure]["table"]
+    return (
+        columns,
+        table_base.to_dict("records"),
+        columns if reform is not None else [],
+        table_reform.to_dict("records"),
+        title,
+    )
+
+
+def make_frame_view(pol, financing, treatment, tab, industry=None, measure="level"):
+    """
+    build the table of one scenario as a frame with string column ids,
+    which custom table mode filters, sorts, and pages on each request; it
+    is read-only, since the view cache shares it between requests
+    """
+    table = make_table(pol, treatment, financing, tab, industry, measure)
+    table.columns = [str(col) for col in table.columns]
+    return shared_data.read_only_frame(table)
+
+
+VIEW_BUILDERS = {
+    "figure": make_figure_view,
+    "animation": make_animation_view,
+    "table": make_table_view,
+    "frame": make_frame_view,
+}
+
+
+def data_fingerprint():
+    """
+    hash of the scenario files, the custom groupings, and the code that
+    turns them into views, used to reject persisted views that were built
+    from other data or code
+    file sizes and modification times stand in for the contents so that
+    the check stays cheap with many large scenario files
+    """
+    h = hashlib.sha256(repr(sorted(SCENARIOS.items())).encode())
+    h.update(json.dumps(GROUPINGS, sort_keys=True).encode())
+    for scenario in SCENARIOS.values():
+        for path in [scenario["asset_path"], scenario["industry_path"]]:
+            stat = os.stat(path)
+            h.update("{}:{}:{}".format(path, stat.st_size, stat.st_mtime_ns).encode())
+    for path in [os.path.abspath(__file__), os.path.join(CURR_PATH, "prepare.py")]:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+view_cache = collections.OrderedDict()
+view_cache_lock = threading.Lock()
+# bumped when scenario data is reloaded, so that views built from the old
+# data while the reload ran are not cached
+view_generation = 0
+
+
+def get_view(kind, *args):
+    """
+    look up a view of one of the VIEW_BUILDERS kinds, building and caching
+    it on a miss
+    """
+    if VIEW_CACHE == "off":
+        return VIEW_BUILDERS[kind](*args)
+
+    key = (kind,) + args
+    with view_cache_lock:
+        view = view_cache.get(key)
+        if view is not None:
+            view_cache.move_to_end(key)
+            return view
+        generation = view_generation
+
+    view = VIEW_BUILDERS[kind](*args)
+    with view_cache_lock:
+        if generation == view_generation:
+            view_cache[key] = view
+            while len(view_cache) > VIEW_CACHE_SIZE:
+                view_cache.popitem(last=False)
+    return view
+
+
+def warm_view_cache(scenarios=DEFAULT_SCENARIOS):
+    """
+    materialize the views for every input combination of the given
+    scenario selection
+    """
+    scenarios = select_scenarios(scenarios)
+    reform = reform_scenario(scenarios)
+    for financing in FINANCING:
+        for treatment in TREATMENTS:
+            for tab in TABS:
+                get_view("table", financing, treatment, tab, reform)
+                if FIGURE_MODE == "animation":
+                    get_view("animation", financing, treatment, tab, scenarios)
+                    continue
+                for year in YEARS:
+                    get_view("figure", year, financing, treatment, tab, scenarios)
+
+
+def load_view_cache(path):
+    """
+    load persisted views, ignoring files built from other data or code
+    returns the number of views loaded
+    """
+    try:
+        with open(path, "rb") as f:
+            saved = pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return 0
+    if saved.get("fingerprint") != data_fingerprint():
+        return 0
+    with view_cache_lock:
+        view_cache.update(saved["views"])
+        while len(view_cache) > VIEW_CACHE_SIZE:
+            view_cache.popitem(last=False)
+    return len(saved["views"])
+
+
+def save_view_cache(path):
+    """
+    persist the cached views; the file is written to a temporary name and
+    renamed so concurrent workers never read a partial file
+    """
+    with view_cache_lock:
+        views = dict(view_cache)
+    data = {"fingerprint": data_fingerprint(), "views": views}
+    shared_data.write_file(
+        path, lambda f: pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    )
+
+
+# "sync" loads persisted views and warms the view cache during import;
+# "background" does so in a thread, after also loading the default
+# scenarios, so that the server can accept requests straight away
+STARTUP_WARMUP = os.environ.get("STARTUP_WARMUP", "sync")
+
+# "server" runs the callbacks in Python on every interaction; "client"
+# ships the data to the browser once and runs them as clientside callbacks
+INTERACTION_MODE = os.environ.get("INTERACTION_MODE", "server")
+
+# "native" sends whole tables to the browser, which pages, filters, and
+# sorts them; "custom" does that on the server and sends only one page.
+# client mode already has the data in the browser, so it is always native
+TABLE_MODE = os.environ.get("TABLE_MODE", "native")
+if INTERACTION_MODE == "client":
+    TABLE_MODE = "native"
+TABLE_PAGE_SIZE = int(os.environ.get("TABLE_PAGE_SIZE", "250"))
+
+# "year" builds a figure per year on the server as the year slider moves;
+# "animation" sends one figure per financing, treatment, and tab with a
+# frame for every year, and the years are played in the browser.
+# client mode already builds the figures in the browser
+FIGURE_MODE = os.environ.get("FIGURE_MODE", "year")
+if INTERACTION_MODE == "client":
+    FIGURE_MODE = "year"
+# gzip responses with flask-compress, when it is installed
+COMPRESS = os.environ.get("COMPRESS", "1") not in ("", "0")
+if COMPRESS and importlib.util.find_spec("flask_compress") is None:
+    warnings.warn("flask-compress is not installed; responses are not compressed")
+    COMPRESS = False
+
+
+def make_client_data():
+    """
+    compact dataset for the clientside callbacks in assets/clientside.js
+    covers every registered scenario, so it suits a modest number of them
+    rows of each (policy, tax_treat) partition are stored column-wise, in
+    the same order as the server-side data, with names encoded as codes
+    into a list of unique names; trace styling and layout are taken from
+    a server-built figure so both modes render identically
+    """
+    policies = list(SCENARIOS)
+    client_data = {
+        "baseline": BASELINE,
+        "policies": policies,
+        "labels": {name: scenario["label"] for name, scenario in SCENARIOS.items()},
+        "tabs": {},
+    }
+    for tab, var, label in [
+        ("asset_tab", "asset_name", "Asset"),
+        ("industry_tab", "Industry", "Industry"),
+    ]:
+        names = set()
+        for pol in policies:
+            for part in get_scenario(pol)[tab]["table_index"].values():
+                names.update(part[var].unique())
+        names = sorted(names)
+        codes = {name: i for i, name in enumerate(names)}
+
+        fig = make_tab_fig(YEARS[0], TREATMENTS[0], FINANCING[0], tab, policies)
+        traces = {}
+        for pol, trace in zip(policies, fig["data"]):
+            trace = {k: v for k, v in trace.items() if k not in ("x", "y")}
+            trace["marker"] = {
+                k: v for k, v in trace["marker"].items() if k not in ("size", "sizeref")
+            }
+            traces[pol] = trace
+        layout = fig["layout"]
+        layout["xaxis"] = {k: v for k, v in layout["xaxis"].items() if k != "range"}
+
+        data = {}
+        for pol in policies:
+            for tax_treat, part in get_scenario(pol)[tab]["table_index"].items():
+                data.setdefault(pol, {})[tax_treat] = {
+                    "name": part[var].map(codes).tolist(),
+                    "year": part["year"].tolist(),
+                    "assets": part["assets"].tolist(),
+                    **{mettr: part[mettr].tolist() for mettr in METRICS},
+                }
+
+        client_data["tabs"][tab] = {
+            "label": label,
+            "names": names,
+            "traces": traces,
+            "layout": layout,
+            # extents of each policy's METRs, which the browser pads into
+            # the x-axis range of the selected policies like xaxis_range
+            "xaxis_extents": {
+                pol: {
+                    financing + "|" + tax_treat: extents[financing]
+                    for tax_treat, extents in get_scenario(pol)[tab]["extents"].items()
+                    for financing in FINANCING
+                }
+                for pol in policies
+            },
+            "xaxis_padding": XAXIS_PADDING,
+            "data": data,
+        }
+    return client_data
+
+
+startup.checkpoint("define views")
+
 app = dash.Dash(
     url_base_pathname=os.environ.get("URL_BASE_PATHNAME", "/"),
     external_stylesheets=external_stylesheets,
+    assets_folder=os.path.join(CURR_PATH, "assets"),
+    compress=COMPRESS,
 )
+
+
+def scenario_options():
+    # options of the scenario dropdown
+    return [
+        {"label": scenario["label"], "value": name}
+        for name, scenario in SCENARIOS.items()
+    ]
+
+
+# dropdown shown on the industry tab to drill down into the detailed
+# industries of a major industry, and the choice of showing reforms as
+# values or as changes from the baseline; client mode has neither
+industry_picker = []
+measure_picker = []
+if INTERACTION_MODE != "client":
+    industry_picker = [
+        html.Div(
+            [
+                html.Label("Major Industry"),
+                dcc.Dropdown(id="industry", placeholder="All major industries"),
+            ],
+            style={"width": "400px", "padding-top": "20px"},
+        )
+    ]
+    measure_picker = [
+        html.Div(
+            [
+                html.Label("Show Reforms As"),
+                dcc.RadioItems(
+                    id="measure",
+                    options=[
+                        {"label": "Values", "value": "level"},
+                        {"label": "Change", "value": "diff"},
+                        {"label": "Percent Change", "value": "pct"},
+                    ],
+                    value="level",
+                    labelStyle={"display": "inline-block", "padding-right": "10px"},
+                ),
+            ],
+            style={
+                "display": "inline-block",
+                "padding-left": "30px",
+                "vertical-align": "top",
+            },
+        )
+    ]
+
 # layout can be thought of as HTML elements
 app.layout = html.Div(
     [
@@ -401,7 +1234,8 @@ app.layout = html.Div(
             ],
             style={
                 "width": "450px",
-                "display": "inline-block",
+                # animated figures have their own year slider
+                "display": "none" if FIGURE_MODE == "animation" else "inline-block",
                 "padding-right": "30px",
                 "padding-bottom": "50px",
                 # "background-color": "#F9F9F9"
@@ -414,9 +1248,8 @@ app.layout = html.Div(
                 dcc.Dropdown(
                     id="financing",
                     options=[
-                        {"label": "Typically Financed", "value": "mettr_mix"},
-                        {"label": "Equity", "value": "mettr_e"},
-                        {"label": "Debt", "value": "mettr_d"},
+                        {"label": FINANCING_LABELS[financing], "value": financing}
+                        for financing in FINANCING
                     ],
                     value="mettr_mix",
                 ),
@@ -435,23 +1268,48 @@ app.layout = html.Div(
                 dcc.Dropdown(
                     id="treatment",
                     options=[
-                        {"label": "Overall", "value": "overall"},
-                        {"label": "Corporate", "value": "corporate"},
-                        {"label": "Non-Corporate", "value": "non-corporate"},
+                        {"label": TREATMENT_LABELS[treatment], "value": treatment}
+                        for treatment in TREATMENTS
                     ],
                     value="overall",
                 ),
             ],
-            style={"width": "200px", "display": "inline-block"},
+            style={
+                "width": "200px",
+                "display": "inline-block",
+                "padding-right": "30px",
+            },
         ),
+        html.Div(
+            [
+                # scenario dropdown
+                html.Label("Scenarios"),
+                dcc.Dropdown(
+                    id="scenarios",
+                    options=scenario_options(),
+                    value=list(DEFAULT_SCENARIOS),
+                    multi=True,
+                ),
+            ],
+            style={"width": "400px", "display": "inline-block"},
+        ),
+    ]
+    + measure_picker
+    + [
         html.Div(
             [
                 dcc.Tabs(
                     id="tabs",
                     value="asset_tab",
                     children=[
-                        dcc.Tab(label="By Asset", value="asset_tab"),
-                        dcc.Tab(label="By Industry", value="industry_tab"),
+                        dcc.Tab(
+                            label="By " + TAB_LABELS["asset_tab"], value="asset_tab"
+                        ),
+                        dcc.Tab(
+                            label="By " + TAB_LABELS["industry_tab"],
+                            value="industry_tab",
+                            children=industry_picker,
+                        ),
                     ],
                 )
             ],
@@ -475,38 +1333,32 @@ app.layout = html.Div(
             dangerously_allow_html=True,
         ),
         dcc.Markdown(
-            """
-            ##### Current Law
-            """,
-            style={"padding-top": "30px"},
+            "##### " + SCENARIOS[BASELINE]["label"], style={"padding-top": "30px"}
         ),
         html.Div(
             [
                 dash_table.DataTable(
                     id="data_table_base",
-                    filter_action="native",
-                    sort_action="native",
+                    filter_action=TABLE_MODE,
+                    sort_action=TABLE_MODE,
                     sort_mode="multi",
-                    page_action="native",
+                    page_action=TABLE_MODE,
+                    page_size=TABLE_PAGE_SIZE,
                     style_cell={"font-size": "12px", "font-family": "HelveticaNeue"},
                 )
             ],
             style={"max-width": "1000px"},
         ),
-        dcc.Markdown(
-            """
-            ##### Biden Proposal
-            """,
-            style={"padding-top": "30px"},
-        ),
+        dcc.Markdown(id="reform_title", style={"padding-top": "30px"}),
         html.Div(
             [
                 dash_table.DataTable(
                     id="data_table_biden",
-                    filter_action="native",
-                    sort_action="native",
+                    filter_action=TABLE_MODE,
+                    sort_action=TABLE_MODE,
                     sort_mode="multi",
-                    page_action="native",
+                    page_action=TABLE_MODE,
+                    page_size=TABLE_PAGE_SIZE,
                     style_cell={"font-size": "12px", "font-family": "HelveticaNeue"},
                 )
             ],
@@ -516,50 +1368,441 @@ app.layout = html.Div(
 )
 
 
-@app.callback(
-    # output is figure
-    [
-        Output("fig_tab", "figure"),
-        Output("data_table_base", "columns"),
-        Output("data_table_base", "data"),
-        Output("data_table_biden", "columns"),
-        Output("data_table_biden", "data"),
-    ],
-    [
-        Input("year", "value"),
-        Input("financing", "value"),
-        Input("treatment", "value"),
-        Input("tabs", "value"),
-    ],
-)
-def update(year, financing, treatment, tab):
-    # call function that constructs figure
+startup.checkpoint("build layout")
+
+
+def view_options(tab, industry, measure="level"):
+    """
+    extra view arguments: the major industry the industry tab drills down
+    into and the measure shown
+    views with neither keep their keys without them
+    """
+    industry = industry if tab == "industry_tab" and industry else None
+    measure = measure or "level"
+    if measure != "level":
+        return (industry, measure)
+    if industry is not None:
+        return (industry,)
+    return ()
 
-    fig_assets, fig_industry, asset_table_base, asset_table_biden, ind_table_base, ind_table_biden = make_fig(
-        year, treatment, financing
+
+def update_figure(
+    year, financing, treatment, tab, scenarios, industry=None, measure="level"
+):
+    # look up the figure for the selected inputs
+    scenarios = select_scenarios(scenarios)
+    args = (year, financing, treatment, tab, scenarios)
+    args += view_options(tab, industry, measure)
+    with metrics.callback_timer(tab=tab, treatment=treatment):
+        return get_view("figure", *args)
+
+
+def patch_figure(figure):
+    """
+    partial update that replaces the trace data of the figure shown in the
+    browser with that of figure, leaving its layout in place
+    """
+    patch = Patch()
+    for i, trace in enumerate(figure["data"]):
+        patch["data"][i]["x"] = trace["x"]
+        patch["data"][i]["y"] = trace["y"]
+        patch["data"][i]["marker"]["size"] = trace["marker"]["size"]
+        patch["data"][i]["marker"]["sizeref"] = trace["marker"]["sizeref"]
+    return patch
+
+
+def update_figure_partial(
+    year, financing, treatment, tab, scenarios, industry=None, measure="level"
+):
+    # when only the year changed, the traces and the layout stay the same
+    # (the x-axis range fits every year), so only the trace data is sent
+    figure = update_figure(
+        year, financing, treatment, tab, scenarios, industry, measure
     )
+    if set(callback_context.triggered_prop_ids) == {"year.value"}:
+        return patch_figure(figure)
+    return figure
 
-    columns_asset = [{"name": str(i), "id": str(i)} for i in asset_table_base.columns]
-    data_asset_base = asset_table_base.to_dict("records")
-    data_asset_biden = asset_table_biden.to_dict("records")
 
-    columns_ind = [{"name": str(i), "id": str(i)} for i in ind_table_base.columns]
-    data_ind_base = ind_table_base.to_dict("records")
-    data_ind_biden = ind_table_biden.to_dict("records")
+def update_animation(
+    financing, treatment, tab, scenarios, industry=None, measure="level"
+):
+    # look up the animated figure for the selected inputs
+    scenarios = select_scenarios(scenarios)
+    args = (financing, treatment, tab, scenarios)
+    args += view_options(tab, industry, measure)
+    with metrics.callback_timer(tab=tab, treatment=treatment):
+        return get_view("animation", *args)
 
-    if tab == "asset_tab":
-        return (
-            fig_assets,
-            columns_asset,
-            data_asset_base,
-            columns_asset,
-            data_asset_biden,
-        )
-    elif tab == "industry_tab":
-        return fig_industry, columns_ind, data_ind_base, columns_ind, data_ind_biden
+
+def update_tables(financing, treatment, tab, scenarios, industry=None, measure="level"):
+    # look up the tables for the selected inputs
+    reform = reform_scenario(scenarios)
+    args = (financing, treatment, tab, reform) + view_options(tab, industry, measure)
+    with metrics.callback_timer(tab=tab, treatment=treatment):
+        return get_view("table", *args)
 
 
+def update_industry_options(scenarios):
+    # major industries with detailed industries in the selected scenarios
+    majors = set()
+    for pol in (BASELINE,) + select_scenarios(scenarios):
+        majors.update(get_scenario(pol)["industry_tab"]["majors"])
+    return [{"label": major, "value": major} for major in sorted(majors)]
+
+
+def update_table_columns(
+    financing, treatment, tab, scenarios, industry=None, measure="level"
+):
+    # columns of both tables and the title of the reform table
+    reform = reform_scenario(scenarios)
+    with metrics.callback_timer(tab=tab, treatment=treatment):
+        table = get_view("frame", BASELINE, financing, treatment, tab)
+    columns = [{"name": col, "id": col} for col in table.columns]
+    if reform is None:
+        return columns, [], ""
+    title = SCENARIOS[reform]["label"] + MEASURES[measure or "level"]["table"]
+    return columns, columns, "##### " + title
+
+
+def make_table_page(
+    pol,
+    financing,
+    treatment,
+    tab,
+    industry,
+    measure,
+    page_current,
+    page_size,
+    sort_by,
+    filter_query,
+):
+    """
+    filter, sort, and page the table of one scenario
+    returns the records of the current page and the number of pages
+    """
+    if pol is None:
+        return [], 1
+    args = (pol, financing, treatment, tab) + view_options(tab, industry, measure)
+    with metrics.callback_timer(tab=tab, treatment=treatment):
+        table = get_view("frame", *args)
+        table = sort_table(filter_table(table, filter_query), sort_by)
+        page_current = page_current or 0
+        page_size = page_size or TABLE_PAGE_SIZE
+        page = table.iloc[page_current * page_size : (page_current + 1) * page_size]
+        return page.to_dict("records"), max(1, -(-len(table) // page_size))
+
+
+def update_base_table_page(
+    financing,
+    treatment,
+    tab,
+    scenarios,
+    industry,
+    measure,
+    page_current,
+    page_size,
+    sort_by,
+    filter_query,
+):
+    # current page of the baseline table, which always shows its values
+    return make_table_page(
+        BASELINE,
+        financing,
+        treatment,
+        tab,
+        industry,
+        "level",
+        page_current,
+        page_size,
+        sort_by,
+        filter_query,
+    )
+
+
+def update_reform_table_page(
+    financing,
+    treatment,
+    tab,
+    scenarios,
+    industry,
+    measure,
+    page_current,
+    page_size,
+    sort_by,
+    filter_query,
+):
+    # current page of the reform table
+    return make_table_page(
+        reform_scenario(scenarios),
+        financing,
+        treatment,
+        tab,
+        industry,
+        measure,
+        page_current,
+        page_size,
+        sort_by,
+        filter_query,
+    )
+
+
+# output is figure
+figure_outputs = Output("fig_tab", "figure")
+figure_inputs = [
+    Input("year", "value"),
+    Input("financing", "value"),
+    Input("treatment", "value"),
+    Input("tabs", "value"),
+    Input("scenarios", "value"),
+]
+figure_callback = update_figure_partial
+if FIGURE_MODE == "animation":
+    # the figure holds every year, so it does not depend on the slider
+    figure_inputs = figure_inputs[1:]
+    figure_callback = update_animation
+# output is the data tables, which do not depend on year
+table_outputs = [
+    Output("data_table_base", "columns"),
+    Output("data_table_base", "data"),
+    Output("data_table_biden", "columns"),
+    Output("data_table_biden", "data"),
+    Output("reform_title", "children"),
+]
+table_inputs = [
+    Input("financing", "value"),
+    Input("treatment", "value"),
+    Input("tabs", "value"),
+    Input("scenarios", "value"),
+]
+if INTERACTION_MODE != "client":
+    # the industry tab drills down into the detailed industries of a major
+    # industry, and reforms can be shown as changes from the baseline;
+    # these views are built on the server
+    for inputs in (figure_inputs, table_inputs):
+        inputs += [Input("industry", "value"), Input("measure", "value")]
+    app.callback(Output("industry", "options"), Input("scenarios", "value"))(
+        update_industry_options
+    )
+
+if INTERACTION_MODE == "client":
+    # the data is sent once with the layout; interactions make no requests
+    app.layout.children.append(dcc.Store(id="client_data", data=make_client_data()))
+    startup.checkpoint("build client data")
+    app.clientside_callback(
+        ClientsideFunction(namespace="ccc", function_name="update_figure"),
+        figure_outputs,
+        figure_inputs + [Input("client_data", "data")],
+    )
+    app.clientside_callback(
+        ClientsideFunction(namespace="ccc", function_name="update_tables"),
+        table_outputs,
+        table_inputs + [Input("client_data", "data")],
+    )
+elif TABLE_MODE == "custom":
+    # columns follow the inputs; each table then sends only its current page
+    app.callback(figure_outputs, figure_inputs)(figure_callback)
+    app.callback(
+        [
+            Output("data_table_base", "columns"),
+            Output("data_table_biden", "columns"),
+            Output("reform_title", "children"),
+        ],
+        table_inputs,
+    )(update_table_columns)
+    for table_id, update_page in [
+        ("data_table_base", update_base_table_page),
+        ("data_table_biden", update_reform_table_page),
+    ]:
+        app.callback(
+            [Output(table_id, "data"), Output(table_id, "page_count")],
+            table_inputs
+            + [
+                Input(table_id, "page_current"),
+                Input(table_id, "page_size"),
+                Input(table_id, "sort_by"),
+                Input(table_id, "filter_query"),
+            ],
+        )(update_page)
+else:
+    app.callback(figure_outputs, figure_inputs)(figure_callback)
+    app.callback(table_outputs, table_inputs)(update_tables)
+
+
+def update(
+    year,
+    financing,
+    treatment,
+    tab,
+    scenarios=DEFAULT_SCENARIOS,
+    industry=None,
+    measure="level",
+):
+    """
+    outputs of both callbacks for one set of inputs
+    """
+    options = (industry, measure)
+    if FIGURE_MODE == "animation":
+        figure = update_animation(financing, treatment, tab, scenarios, *options)
+    else:
+        figure = update_figure(year, financing, treatment, tab, scenarios, *options)
+    return (figure,) + update_tables(financing, treatment, tab, scenarios, *options)
+
+
+startup.checkpoint("register callbacks")
+
+
+def warm_up():
+    """
+    load persisted views and, in eager mode, build the rest
+    """
+    if STARTUP_WARMUP == "background":
+        startup.load_lazy_modules()
+        for name in DEFAULT_SCENARIOS:
+            get_scenario(name)
+    if VIEW_CACHE != "off":
+        n_loaded = load_view_cache(VIEW_CACHE_PATH) if VIEW_CACHE_PATH else 0
+        if VIEW_CACHE == "eager":
+            warm_view_cache()
+            if VIEW_CACHE_PATH and len(view_cache) > n_loaded:
+                save_view_cache(VIEW_CACHE_PATH)
+
+
+# seconds between checks for added, changed, or removed scenario files;
+# 0 turns hot reloading off
+SCENARIO_RELOAD_INTERVAL = float(os.environ.get("SCENARIO_RELOAD_INTERVAL", "0"))
+
+
+scenario_signatures = {}
+
+
+def view_scenarios(key):
+    """
+    names of the scenarios a cached view was built from; every view also
+    depends on the baseline, which sizes the bubbles and heads the tables
+    """
+    kind, args = key[0], key[1:]
+    if kind == "figure":
+        names = args[4]
+    elif kind == "animation":
+        names = args[3]
+    elif kind == "table":
+        names = (args[3],)
+    else:
+        names = (args[0],)
+    return {BASELINE}.union(names)
+
+
+def reload_scenarios():
+    """
+    pick up added, changed, and removed scenarios
+    changed scenarios that are loaded are re-aggregated while requests are
+    still served from the old data, then swapped in together with dropping
+    the views built from them; other scenarios and views are kept
+    returns the names of the scenarios that changed
+    """
+    global REGISTRY, SCENARIOS, view_generation
+    registry = load_registry()
+    if registry["baseline"] != BASELINE:
+        warnings.warn("the baseline scenario changed; restart the app to use it")
+        return []
+    signatures = {}
+    for name, scenario in registry["scenarios"].items():
+        try:
+            signatures[name] = scenario_signature(scenario)
+        except OSError:
+            # a file is being replaced; check again next time
+            return []
+    changed = [
+        name
+        for name in set(signatures) | set(scenario_signatures)
+        if signatures.get(name) != scenario_signatures.get(name)
+    ]
+    if not changed:
+        return []
+
+    with scenario_cache_lock:
+        loaded = [name for name in changed if name in scenario_cache]
+        if BASELINE in changed:
+            # every reform's changes are measured against the baseline
+            loaded = [BASELINE] + [name for name in scenario_cache if name != BASELINE]
+    rebuilt = {}
+    for name in loaded:
+        if name not in registry["scenarios"]:
+            continue
+        baseline = None
+        if name != BASELINE:
+            baseline = rebuilt.get(BASELINE) or get_scenario(BASELINE)
+        rebuilt[name] = load_indexed(registry["scenarios"], name, baseline)
+
+    with scenario_cache_lock, view_cache_lock:
+        REGISTRY, SCENARIOS = registry, registry["scenarios"]
+        for name in changed:
+            scenario_cache.pop(name, None)
+        scenario_cache.update(rebuilt)
+        for key in list(view_cache):
+            # every view may show changes measured against the baseline
+            if BASELINE in changed or view_scenarios(key).intersection(changed):
+                del view_cache[key]
+        view_generation += 1
+    scenario_signatures.update(signatures)
+    for name in set(scenario_signatures) - set(signatures):
+        del scenario_signatures[name]
+
+    app.layout["scenarios"].options = scenario_options()
+    response_cache.invalidate(data_fingerprint())
+    if VIEW_CACHE == "eager":
+        warm_view_cache()
+    return changed
+
+
+def watch_scenarios():
+    """
+    reload changed scenarios every SCENARIO_RELOAD_INTERVAL seconds
+    reloads and failures go to the Flask app's logger; warnings would show
+    a repeated message only once
+    """
+    while True:
+        time.sleep(SCENARIO_RELOAD_INTERVAL)
+        try:
+            changed = reload_scenarios()
+        except Exception as e:
+            # keep serving the current data and try again next time
+            app.server.logger.warning("reloading scenarios failed: %s", e)
+            continue
+        if changed:
+            app.server.logger.info("reloaded scenarios: %s", ", ".join(sorted(changed)))
+
+
+if VIEW_CACHE != "off" and VIEW_CACHE != "eager" and VIEW_CACHE_PATH:
+    atexit.register(save_view_cache, VIEW_CACHE_PATH)
+if SCENARIO_RELOAD_INTERVAL and INTERACTION_MODE == "server":
+    # clientside callbacks use the data sent with the page, so hot
+    # reloading only applies to server mode
+    scenario_signatures.update(
+        (name, scenario_signature(scenario)) for name, scenario in SCENARIOS.items()
+    )
+    # show the reloads unless the logger was configured otherwise
+    if app.server.logger.level == logging.NOTSET:
+        app.server.logger.setLevel(logging.INFO)
+    threading.Thread(
+        target=watch_scenarios, name="scenario-reload", daemon=True
+    ).start()
+if STARTUP_WARMUP == "background":
+    threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
+else:
+    warm_up()
+    startup.checkpoint("warm up")
+
 server = app.server
+metrics.register(
+    server,
+    callback=[output.strip(".").split(".")[0] for output in app.callback_map],
+    tab=TABS,
+    treatment=TREATMENTS,
+)
+response_cache.register(server, data_fingerprint())
+startup.finish()
 # turn debug=False for production
 if __name__ == "__main__":
     app.run_server(debug=True, use_reloader=True)
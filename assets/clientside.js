@@ -0,0 +1,160 @@
+/*
+ * Clientside callbacks used when the app runs with INTERACTION_MODE=client.
+ * They rebuild the figure and tables from the dataset that app.py ships in
+ * the "client_data" store, mirroring make_tab_fig and make_table_view.
+ */
+
+function cccCopy(obj) {
+    return JSON.parse(JSON.stringify(obj));
+}
+
+// numpy-style rounding (half to even) so tables match the server's round()
+function cccRound(value, decimals) {
+    var scale = Math.pow(10, decimals);
+    var scaled = value * scale;
+    var rounded = Math.round(scaled);
+    if (Math.abs(scaled % 1) === 0.5) {
+        rounded = 2 * Math.round(scaled / 2);
+    }
+    return rounded / scale;
+}
+
+// selected scenarios in registry order
+function cccSelected(store, scenarios) {
+    return store.policies.filter(function (pol) {
+        return (scenarios || []).indexOf(pol) >= 0;
+    });
+}
+
+// positions of the rows for one year, omitting the 'Overall' bubble
+function cccRows(view, part, year) {
+    var rows = [];
+    for (var i = 0; i < part.year.length; i++) {
+        if (part.year[i] === year && view.names[part.name[i]] !== "Overall") {
+            rows.push(i);
+        }
+    }
+    return rows;
+}
+
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ccc: {
+        update_figure: function (year, financing, treatment, tab, scenarios, store) {
+            if (!store) {
+                return window.dash_clientside.no_update;
+            }
+            var view = store.tabs[tab];
+
+            // scale the size of the bubbles by the current law asset data
+            var assetView = store.tabs.asset_tab;
+            var assetPart = assetView.data[store.baseline][treatment];
+            var sizes = cccRows(assetView, assetPart, year).map(function (i) {
+                return assetPart.assets[i];
+            });
+            var sizeref = (2.0 * Math.max.apply(null, sizes)) / Math.pow(60.0, 2);
+
+            var data = cccSelected(store, scenarios).map(function (pol) {
+                var part = view.data[pol][treatment];
+                var rows = cccRows(view, part, year);
+                var trace = cccCopy(view.traces[pol]);
+                trace.x = rows.map(function (i) {
+                    return part[financing][i];
+                });
+                trace.y = rows.map(function (i) {
+                    return view.names[part.name[i]];
+                });
+                trace.marker.size = rows.map(function (i) {
+                    return part.assets[i];
+                });
+                trace.marker.sizeref = sizeref;
+                return trace;
+            });
+
+            // fit the x-axis to every year of the selected policies
+            var layout = cccCopy(view.layout);
+            var low = Infinity;
+            var high = -Infinity;
+            cccSelected(store, scenarios).forEach(function (pol) {
+                var extent = view.xaxis_extents[pol][financing + "|" + treatment];
+                if (extent) {
+                    low = Math.min(low, extent[0]);
+                    high = Math.max(high, extent[1]);
+                }
+            });
+            if (low <= high) {
+                var pad = view.xaxis_padding * (high - low || Math.abs(high) || 1.0);
+                layout.xaxis.range = [low - pad, high + pad];
+            }
+            return {data: data, layout: layout};
+        },
+
+        update_tables: function (financing, treatment, tab, scenarios, store) {
+            if (!store) {
+                return window.dash_clientside.no_update;
+            }
+            var view = store.tabs[tab];
+            var outputs = [];
+
+            // the baseline and the first selected reform
+            var reform = cccSelected(store, scenarios).filter(function (pol) {
+                return pol !== store.baseline;
+            })[0];
+
+            [store.baseline, reform].forEach(function (pol) {
+                if (pol === undefined) {
+                    outputs.push([], []);
+                    return;
+                }
+                var part = view.data[pol][treatment];
+
+                // pivot names by year, averaging duplicate rows
+                var sums = {};
+                var counts = {};
+                var years = [];
+                var names = [];
+                for (var i = 0; i < part.year.length; i++) {
+                    var name = view.names[part.name[i]];
+                    var year = part.year[i];
+                    if (!(name in sums)) {
+                        sums[name] = {};
+                        counts[name] = {};
+                        names.push(name);
+                    }
+                    if (years.indexOf(year) < 0) {
+                        years.push(year);
+                    }
+                    sums[name][year] = (sums[name][year] || 0) + part[financing][i];
+                    counts[name][year] = (counts[name][year] || 0) + 1;
+                }
+                years.sort();
+                names.sort();
+
+                // Overall row is at the top
+                var overall = names.indexOf("Overall");
+                if (overall > 0) {
+                    names.splice(overall, 1);
+                    names.unshift("Overall");
+                }
+
+                var columns = [{name: view.label, id: view.label}].concat(
+                    years.map(function (year) {
+                        return {name: String(year), id: String(year)};
+                    })
+                );
+                var records = names.map(function (name) {
+                    var record = {};
+                    record[view.label] = name;
+                    years.forEach(function (year) {
+                        record[year] = counts[name][year]
+                            ? cccRound(sums[name][year] / counts[name][year], 3)
+                            : null;
+                    });
+                    return record;
+                });
+                outputs.push(columns, records);
+            });
+            outputs.push(reform === undefined ? "" : "##### " + store.labels[reform]);
+            return outputs;
+        },
+    },
+});
@@ -0,0 +1,121 @@
+"""
+Benchmark of calc_overall_treat against the original groupby/apply
+implementation on synthetic asset data scaled up from the bundled CSVs
+
+    python benchmarks/bench_aggregation.py --scales 10 100 1000
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+CURR_PATH = os.path.abspath(os.path.dirname(__file__))
+sys.path.insert(0, os.path.dirname(CURR_PATH))
+
+from prepare import calc_overall_treat  # noqa: E402
+
+
+def calc_overall_treat_legacy(df, var):
+    """
+    original implementation: three groupby/apply passes and two merges
+    per metric
+    """
+    for mettr in ["mettr_d", "mettr_e", "mettr_mix"]:
+        mettr_tot = mettr + "_tot"
+        mettr_ovr = mettr + "_ovr"
+        df[mettr_tot] = df["assets"] * df[mettr]
+
+        g = df.groupby([var, "year", "policy"])
+        sr = g.apply(lambda x: x[mettr_tot].sum()) / g.apply(
+            lambda x: x["assets"].sum()
+        )
+        sr_size = g.apply(lambda x: x["assets"].sum())
+
+        df = pd.merge(
+            df, sr.to_frame().rename(columns={0: mettr_ovr}), on=[var, "year", "policy"]
+        )
+
+        df = pd.merge(
+            df,
+            sr_size.to_frame().rename(columns={0: "assets_ovr"}),
+            on=[var, "year", "policy"],
+        )
+    return df.sort_values("assets_ovr")
+
+
+def load_assets():
+    """
+    combine current law and Biden results by asset, as prepare.py does
+    """
+    frames = []
+    for policy, fname in [
+        ("base", "baseline_results_assets.csv"),
+        ("biden", "biden_results_assets.csv"),
+    ]:
+        df = pd.read_csv(os.path.join(CURR_PATH, "..", "data", fname))
+        df["policy"] = policy
+        frames.append(df)
+    return pd.concat(frames)
+
+
+def scale_assets(df, scale):
+    """
+    replicate the rows `scale` times as distinct assets so that both the
+    row count and the number of groups grow with the scale
+    """
+    out = pd.concat([df] * scale, ignore_index=True)
+    copy = np.repeat(np.arange(scale), len(df)).astype(str)
+    out["asset_name"] = out["asset_name"].to_numpy() + " " + copy
+    return out
+
+
+def time_call(func, df, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        data = df.copy()
+        start = time.perf_counter()
+        func(data, "asset_name")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--legacy-max-scale",
+        type=int,
+        default=1000,
+        help="skip the original implementation above this scale",
+    )
+    args = parser.parse_args(argv)
+
+    df = load_assets()
+    print(
+        "{:>6} {:>10} {:>12} {:>12} {:>9}".format(
+            "scale", "rows", "legacy (s)", "current (s)", "speedup"
+        )
+    )
+    for scale in args.scales:
+        data = scale_assets(df, scale)
+        current = time_call(calc_overall_treat, data, args.repeat)
+        if scale <= args.legacy_max_scale:
+            legacy = time_call(calc_overall_treat_legacy, data, 1)
+            speedup = "{:>8.1f}x".format(legacy / current)
+            legacy = "{:>12.4f}".format(legacy)
+        else:
+            legacy, speedup = "{:>12}".format("-"), "{:>9}".format("-")
+        print(
+            "{:>6} {:>10} {} {:>12.4f} {}".format(
+                scale, len(data), legacy, current, speedup
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Memory of an app.py worker with FRAME_STORAGE=full and compact, on the
+bundled data scaled up with synthetic copies of every asset and industry
+
+    python benchmarks/bench_memory.py [--scales 1 10 100 ...]
+
+For each scale and storage mode a fresh worker loads every scenario and
+builds every view, then reports its resident memory and the deep memory
+usage of the partitioned scenario frames.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+CURR_PATH = os.path.abspath(os.path.dirname(__file__))
+ROOT_PATH = os.path.dirname(CURR_PATH)
+sys.path.insert(0, ROOT_PATH)
+
+from bench_suite import run_json, write_synthetic  # noqa: E402
+
+# load every scenario and build every view, then report the memory of the
+# process and of the scenario frames
+LOAD_APP = """
+import json
+import app, startup
+for name in app.SCENARIOS:
+    if name != app.BASELINE:
+        app.warm_view_cache((app.BASELINE, name))
+# partitions of a categorical column share its categories; count them once
+seen = set()
+def usage(part):
+    total = part.index.nbytes
+    for col in part.columns:
+        values = part[col]
+        if values.dtype == "category":
+            total += values.cat.codes.nbytes
+            if id(values.cat.categories) not in seen:
+                seen.add(id(values.cat.categories))
+                total += values.cat.categories.memory_usage(deep=True)
+        else:
+            total += values.memory_usage(index=False, deep=True)
+    return total
+frames = 0
+for data in app.scenario_cache.values():
+    for tab in data.values():
+        parts = [tab["empty"]]
+        for key, index in tab.items():
+            if key.endswith("_index"):
+                parts += list(index.values())
+        frames += sum(usage(part) for part in parts)
+print(json.dumps({"rss_mb": startup.rss_mb(), "frames_mb": frames / 2 ** 20}))
+"""
+
+STORAGE_MODES = ["full", "compact"]
+
+
+def run_scale(scale):
+    """
+    memory of a worker in each storage mode on the data scaled up `scale`
+    times
+    """
+    with tempfile.TemporaryDirectory() as path:
+        manifest_path = write_synthetic(path, scale)
+        prepared_path = os.path.join(path, "prepared")
+        env = dict(
+            os.environ,
+            SCENARIO_MANIFEST=manifest_path,
+            PREPARED_DATA_PATH=prepared_path,
+            VIEW_CACHE="lazy",
+            STARTUP_WARMUP="sync",
+            INTERACTION_MODE="server",
+        )
+        for name in ("SCENARIO_DIR", "VIEW_CACHE_PATH", "STARTUP_PROFILE"):
+            env.pop(name, None)
+        subprocess.run(
+            [sys.executable, "-W", "ignore", "prepare.py", "--output", prepared_path],
+            cwd=ROOT_PATH,
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        return {
+            mode: run_json(["-c", LOAD_APP], dict(env, FRAME_STORAGE=mode))
+            for mode in STORAGE_MODES
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    args = parser.parse_args(argv)
+
+    print("{:>6} {:<8} {:>10} {:>10}".format("scale", "storage", "rss", "frames"))
+    for scale in args.scales:
+        results = run_scale(scale)
+        for mode in STORAGE_MODES:
+            print(
+                "{:>6} {:<8} {:>8.1f}MB {:>8.1f}MB".format(
+                    scale, mode, results[mode]["rss_mb"], results[mode]["frames_mb"]
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
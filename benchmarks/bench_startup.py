@@ -0,0 +1,84 @@
+"""
+Startup time of app.py with and without the prepared data artifact
+
+    python prepare.py && python benchmarks/bench_startup.py
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+CURR_PATH = os.path.abspath(os.path.dirname(__file__))
+ROOT_PATH = os.path.dirname(CURR_PATH)
+sys.path.insert(0, ROOT_PATH)
+
+from prepare import (  # noqa: E402
+    PREPARED_DATA_PATH,
+    load_registry,
+    prepare_scenario,
+    read_prepared,
+    source_checksum,
+)
+
+IMPORT_APP = "import app; [app.get_scenario(name) for name in app.DEFAULT_SCENARIOS]"
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def import_app(prepared_path):
+    """
+    import app.py in a fresh interpreter and load the default scenarios
+    """
+    env = dict(os.environ, PREPARED_DATA_PATH=prepared_path, VIEW_CACHE="lazy")
+    env.pop("VIEW_CACHE_PATH", None)
+    subprocess.run(
+        [sys.executable, "-W", "ignore", "-c", IMPORT_APP],
+        cwd=ROOT_PATH,
+        env=env,
+        check=True,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    scenarios = list(load_registry()["scenarios"].values())
+
+    def read_artifacts():
+        return [
+            read_prepared(
+                os.path.join(PREPARED_DATA_PATH, scenario["name"]),
+                source_checksum(scenario),
+            )
+            for scenario in scenarios
+        ]
+
+    if any(frames is None for frames in read_artifacts()):
+        sys.exit(
+            "no up-to-date artifact in {}; run prepare.py".format(PREPARED_DATA_PATH)
+        )
+
+    missing_path = os.path.join(PREPARED_DATA_PATH, "missing")
+    rows = [
+        ("load data: csv pipeline", lambda: [prepare_scenario(s) for s in scenarios]),
+        ("load data: artifact", read_artifacts),
+        ("import app: csv pipeline", lambda: import_app(missing_path)),
+        ("import app: artifact", lambda: import_app(PREPARED_DATA_PATH)),
+    ]
+    for name, func in rows:
+        print("{:<28} {:>8.4f}s".format(name, best_of(func, args.repeat)))
+
+
+if __name__ == "__main__":
+    main()
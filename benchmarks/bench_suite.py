@@ -0,0 +1,380 @@
+"""
+Benchmark suite for app.py on the bundled data scaled up with synthetic
+copies of every asset and industry
+
+    python benchmarks/bench_suite.py [--scales 1 10 100 ...] [--save-baseline]
+
+For each scale the suite times loading the app from the CSVs and from the
+prepared artifact, calc_overall_treat, make_fig for every input
+combination, and the figure and table callbacks served end to end. Each
+case records its best time, the size of what it sends to the browser,
+and its peak memory. The results are compared with
+benchmarks/baselines.json, and the run fails when a case regresses past
+its baseline by more than the tolerance. Baselines depend on the machine,
+so save them on the machine that runs the suite.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+CURR_PATH = os.path.abspath(os.path.dirname(__file__))
+ROOT_PATH = os.path.dirname(CURR_PATH)
+sys.path.insert(0, ROOT_PATH)
+
+BASELINE_PATH = os.path.join(CURR_PATH, "baselines.json")
+# slowdowns smaller than this many seconds are timer noise, not regressions
+MIN_SLOWDOWN = 0.05
+
+# import app and load the default scenarios, then report the time and the
+# peak resident memory of the process
+LOAD_APP = """
+import json, resource, time
+start = time.perf_counter()
+import app
+for name in app.DEFAULT_SCENARIOS:
+    app.get_scenario(name)
+print(json.dumps({
+    "seconds": time.perf_counter() - start,
+    "peak_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+"""
+
+# case -> (metric, ...) in report order
+CASES = [
+    ("load_csv", ("seconds", "peak_mb")),
+    ("load_artifact", ("seconds", "peak_mb")),
+    ("calc_overall_treat", ("seconds", "peak_mb")),
+    ("make_fig", ("seconds", "bytes", "peak_mb")),
+    ("callbacks", ("seconds", "bytes", "peak_mb")),
+]
+
+
+def scale_frame(df, columns, scale):
+    """
+    replicate the rows `scale` times as distinct assets or industries, so
+    that both the row count and the number of groups grow with the scale
+    the first copy keeps the original names
+    """
+    import numpy as np
+    import pandas as pd
+
+    out = pd.concat([df] * scale, ignore_index=True)
+    suffix = np.repeat([""] + [" {}".format(i) for i in range(1, scale)], len(df))
+    for col in columns:
+        out[col] = out[col].to_numpy().astype(object) + suffix
+    return out
+
+
+def write_synthetic(path, scale):
+    """
+    write the bundled scenarios scaled up `scale` times and a manifest
+    listing them to path
+    returns the manifest path
+    """
+    import pandas as pd
+
+    with open(os.path.join(ROOT_PATH, "data", "scenarios.json")) as f:
+        manifest = json.load(f)
+    for entry in manifest["scenarios"]:
+        for key, columns in [
+            ("assets", ["asset_name"]),
+            ("industry", ["Industry", "major_industry"]),
+        ]:
+            df = pd.read_csv(os.path.join(ROOT_PATH, "data", entry[key]))
+            scale_frame(df, columns, scale).to_csv(
+                os.path.join(path, entry[key]), index=False
+            )
+    manifest_path = os.path.join(path, "scenarios.json")
+    with open(manifest_path, "w") as f:
+        json.dump(manifest, f)
+    return manifest_path
+
+
+def run_json(args, env):
+    """
+    run a Python snippet or script and parse the JSON on its last line
+    """
+    proc = subprocess.run(
+        [sys.executable, "-W", "ignore"] + args,
+        cwd=ROOT_PATH,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode:
+        sys.exit(proc.stderr)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def best_of(func, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_mb(func):
+    """
+    peak memory in MB allocated by Python while func runs
+    """
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1] / 2**20
+    finally:
+        tracemalloc.stop()
+
+
+def callback_requests(client):
+    """
+    the figure and table callback requests for every input combination
+    """
+    import app
+
+    # only the callbacks with a figure or table data output, so that other
+    # callbacks, such as the drill-down options, do not change the workload
+    deps = [
+        dep
+        for dep in client.get("/_dash-dependencies").json
+        if not dep.get("clientside_function")
+        and any(
+            output.split(".")[-1] in ("figure", "data")
+            for output in dep["output"].strip(".").split("...")
+        )
+    ]
+    bodies = []
+    for year, financing, treatment, tab in itertools.product(
+        app.YEARS, app.FINANCING, app.TREATMENTS, app.TABS
+    ):
+        values = {
+            "year": year,
+            "financing": financing,
+            "treatment": treatment,
+            "tabs": tab,
+            "scenarios": list(app.DEFAULT_SCENARIOS),
+        }
+        for dep in deps:
+            outputs = [
+                dict(zip(("id", "property"), output.split(".")))
+                for output in dep["output"].strip(".").split("...")
+            ]
+            inputs = [
+                dict(item, value=values.get(item["id"])) for item in dep["inputs"]
+            ]
+            bodies.append(
+                {
+                    "output": dep["output"],
+                    "outputs": (
+                        outputs if dep["output"].startswith("..") else outputs[0]
+                    ),
+                    "inputs": inputs,
+                    "state": [],
+                    "changedPropIds": [inputs[0]["id"] + "." + inputs[0]["property"]],
+                }
+            )
+    return bodies
+
+
+def worker(repeat):
+    """
+    run the in-process cases against the scenarios named by
+    SCENARIO_MANIFEST and print the results as JSON
+    """
+    import pandas as pd
+    import plotly.io
+
+    import app
+    from prepare import calc_overall_treat
+
+    results = {}
+
+    assets = pd.read_csv(app.SCENARIOS[app.BASELINE]["asset_path"])
+    assets["policy"] = app.BASELINE
+
+    def aggregate():
+        calc_overall_treat(assets, "asset_name")
+
+    results["calc_overall_treat"] = {
+        "seconds": best_of(aggregate, repeat),
+        "peak_mb": peak_mb(aggregate),
+    }
+
+    combinations = list(itertools.product(app.YEARS, app.TREATMENTS, app.FINANCING))
+
+    def make_figs():
+        return [app.make_fig(*args) for args in combinations]
+
+    size = 0
+    for figs in make_figs():
+        size += sum(len(plotly.io.to_json(fig)) for fig in figs[:2])
+    results["make_fig"] = {
+        "seconds": best_of(make_figs, repeat),
+        "bytes": size,
+        "peak_mb": peak_mb(make_figs),
+    }
+
+    client = app.server.test_client()
+    bodies = callback_requests(client)
+
+    def post_callbacks():
+        sizes = []
+        for body in bodies:
+            response = client.post("/_dash-update-component", json=body)
+            if response.status_code != 200:
+                raise RuntimeError(response.get_data(as_text=True))
+            sizes.append(len(response.data))
+        return sum(sizes)
+
+    results["callbacks"] = {
+        "seconds": best_of(post_callbacks, repeat),
+        "bytes": post_callbacks(),
+        "peak_mb": peak_mb(post_callbacks),
+    }
+    print(json.dumps(results))
+
+
+def run_scale(scale, repeat):
+    """
+    results of every case on the data scaled up `scale` times
+    """
+    with tempfile.TemporaryDirectory() as path:
+        manifest_path = write_synthetic(path, scale)
+        prepared_path = os.path.join(path, "prepared")
+        # every request recomputes its outputs, served uncompressed
+        env = dict(
+            os.environ,
+            SCENARIO_MANIFEST=manifest_path,
+            PREPARED_DATA_PATH=prepared_path,
+            VIEW_CACHE="off",
+            STARTUP_WARMUP="sync",
+            INTERACTION_MODE="server",
+            FIGURE_MODE="year",
+            COMPRESS="0",
+        )
+        for name in ("SCENARIO_DIR", "VIEW_CACHE_PATH", "STARTUP_PROFILE"):
+            env.pop(name, None)
+        subprocess.run(
+            [sys.executable, "-W", "ignore", "prepare.py", "--output", prepared_path],
+            cwd=ROOT_PATH,
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+
+        results = {}
+        for case, prepared in [
+            ("load_csv", os.path.join(path, "missing")),
+            ("load_artifact", prepared_path),
+        ]:
+            runs = [
+                run_json(["-c", LOAD_APP], dict(env, PREPARED_DATA_PATH=prepared))
+                for _ in range(repeat)
+            ]
+            results[case] = {
+                "seconds": min(run["seconds"] for run in runs),
+                "peak_mb": max(run["peak_mb"] for run in runs),
+            }
+        results.update(run_json([__file__, "--worker", "--repeat", str(repeat)], env))
+    return results
+
+
+def compare(results, baselines, tolerance, size_tolerance):
+    """
+    print the results next to their baselines
+    returns the (scale, case, metric) that regressed
+    """
+    regressions = []
+    print(
+        "{:>6} {:<20} {:<8} {:>14} {:>14} {:>8}".format(
+            "scale", "case", "metric", "result", "baseline", "ratio"
+        )
+    )
+    for scale, cases in results.items():
+        for case, metrics in CASES:
+            for metric in metrics:
+                value = cases[case][metric]
+                base = baselines.get(scale, {}).get(case, {}).get(metric)
+                if base:
+                    ratio = value / base
+                    limit = tolerance if metric == "seconds" else size_tolerance
+                    flag = ""
+                    if ratio > 1 + limit and (
+                        metric != "seconds" or value - base > MIN_SLOWDOWN
+                    ):
+                        regressions.append((scale, case, metric))
+                        flag = " REGRESSED"
+                    ratio = "{:>7.2f}x{}".format(ratio, flag)
+                    base = "{:>14.4f}".format(base)
+                else:
+                    base, ratio = "{:>14}".format("-"), "{:>8}".format("-")
+                print(
+                    "{:>6} {:<20} {:<8} {:>14.4f} {} {}".format(
+                        scale, case, metric, value, base, ratio
+                    )
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--baselines", default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="store the results as the new baselines instead of comparing",
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="allowed fractional slowdown before a case fails",
+    )
+    parser.add_argument(
+        "--size-tolerance",
+        type=float,
+        default=0.1,
+        help="allowed fractional growth of payload sizes and peak memory",
+    )
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        worker(args.repeat)
+        return
+
+    results = {str(scale): run_scale(scale, args.repeat) for scale in args.scales}
+
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)
+    regressions = compare(results, baselines, args.tolerance, args.size_tolerance)
+
+    if args.save_baseline:
+        baselines.update(results)
+        with open(args.baselines, "w") as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print("saved baselines to {}".format(args.baselines))
+    elif regressions:
+        sys.exit(
+            "{} regression(s): {}".format(
+                len(regressions),
+                ", ".join("/".join(regression) for regression in regressions),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""
+Memory of `gunicorn app:server` by number of workers and FRAME_STORAGE, on
+the bundled data scaled up with synthetic copies of every asset and
+industry
+
+    python benchmarks/bench_workers.py [--scales 1 10 ...] [--workers 1 2 4 ...] [--preload]
+
+For each scale, storage mode, and number of workers, gunicorn is started
+with every worker loading the default scenarios and building their views,
+and the memory of the master and the workers is summed once all workers
+are ready. `rss` counts pages shared between processes once per process;
+`pss` splits them between the processes sharing them, so it is what the
+processes add up to. `shm` is the size of the files of
+FRAME_STORAGE=shared, which are held in shared memory once and are part
+of `pss` where the workers touched them.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+CURR_PATH = os.path.abspath(os.path.dirname(__file__))
+ROOT_PATH = os.path.dirname(CURR_PATH)
+sys.path.insert(0, ROOT_PATH)
+
+from bench_suite import write_synthetic  # noqa: E402
+
+# gunicorn hook creating a file named by the pid of each worker once it
+# has loaded the app
+GUNICORN_CONFIG = """
+import os
+
+def post_worker_init(worker):
+    open(os.path.join(os.environ["READY_PATH"], str(worker.pid)), "w").close()
+"""
+# seconds to wait for the workers to load the app
+READY_TIMEOUT = 600
+
+STORAGE_MODES = ["full", "compact", "shared"]
+
+
+def memory_kb(pid):
+    """
+    resident and proportional set size of a process in kB
+    """
+    sizes = {}
+    with open("/proc/{}/smaps_rollup".format(pid)) as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            if name in ("Rss", "Pss"):
+                sizes[name] = int(value.split()[0])
+    return sizes["Rss"], sizes["Pss"]
+
+
+def directory_mb(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, name)) for name in files)
+    return total / 2**20
+
+
+def run_gunicorn(env, workers, preload, path):
+    """
+    start gunicorn with workers, wait until every worker is ready, and
+    return the summed rss and pss in MB of the master and the workers
+    """
+    config_path = os.path.join(path, "gunicorn_config.py")
+    with open(config_path, "w") as f:
+        f.write(GUNICORN_CONFIG)
+    ready_path = tempfile.mkdtemp(dir=path)
+    args = [
+        sys.executable,
+        "-W",
+        "ignore",
+        "-m",
+        "gunicorn",
+        "--config",
+        config_path,
+        "--bind",
+        "127.0.0.1:0",
+        "--workers",
+        str(workers),
+        "--timeout",
+        "600",
+    ]
+    if preload:
+        args.append("--preload")
+    proc = subprocess.Popen(
+        args + ["app:server"],
+        cwd=ROOT_PATH,
+        env=dict(env, READY_PATH=ready_path),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + READY_TIMEOUT
+        while True:
+            # a worker that died is replaced, so only count live ones
+            pids = [
+                int(name)
+                for name in os.listdir(ready_path)
+                if os.path.exists("/proc/{}".format(name))
+            ]
+            if len(pids) == workers:
+                break
+            if proc.poll() is not None:
+                sys.exit("gunicorn exited before its workers were ready")
+            if time.monotonic() > deadline:
+                sys.exit("gunicorn workers were not ready in time")
+            time.sleep(0.1)
+        sizes = [memory_kb(pid) for pid in [proc.pid] + pids]
+        return {
+            "rss_mb": sum(rss for rss, _ in sizes) / 1024,
+            "pss_mb": sum(pss for _, pss in sizes) / 1024,
+        }
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def run_scale(scale, workers_list, preload):
+    """
+    memory of gunicorn in each storage mode and with each number of
+    workers on the data scaled up `scale` times
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as path:
+        manifest_path = write_synthetic(path, scale)
+        prepared_path = os.path.join(path, "prepared")
+        env = dict(
+            os.environ,
+            SCENARIO_MANIFEST=manifest_path,
+            PREPARED_DATA_PATH=prepared_path,
+            VIEW_CACHE="eager",
+            STARTUP_WARMUP="sync",
+            INTERACTION_MODE="server",
+            FIGURE_MODE="year",
+        )
+        for name in ("SCENARIO_DIR", "VIEW_CACHE_PATH", "STARTUP_PROFILE"):
+            env.pop(name, None)
+        subprocess.run(
+            [sys.executable, "-W", "ignore", "prepare.py", "--output", prepared_path],
+            cwd=ROOT_PATH,
+            env=env,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        for mode in STORAGE_MODES:
+            for workers in workers_list:
+                with tempfile.TemporaryDirectory(
+                    dir="/dev/shm" if os.path.isdir("/dev/shm") else None
+                ) as shared_path:
+                    result = run_gunicorn(
+                        dict(env, FRAME_STORAGE=mode, SHARED_DATA_PATH=shared_path),
+                        workers,
+                        preload,
+                        path,
+                    )
+                    result["shm_mb"] = directory_mb(shared_path)
+                results[mode, workers] = result
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 10])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument(
+        "--preload",
+        action="store_true",
+        help="load the app in the master before forking the workers",
+    )
+    args = parser.parse_args(argv)
+
+    print(
+        "{:>6} {:<8} {:>7} {:>10} {:>10} {:>10}".format(
+            "scale", "storage", "workers", "rss", "pss", "shm"
+        )
+    )
+    for scale in args.scales:
+        results = run_scale(scale, args.workers, args.preload)
+        for (mode, workers), result in results.items():
+            print(
+                "{:>6} {:<8} {:>7} {:>8.1f}MB {:>8.1f}MB {:>8.1f}MB".format(
+                    scale,
+                    mode,
+                    workers,
+                    result["rss_mb"],
+                    result["pss_mb"],
+                    result["shm_mb"],
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
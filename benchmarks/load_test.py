@@ -0,0 +1,386 @@
+"""
+Throughput and latency of `gunicorn app:server` in each SERVING_MODE under
+simulated users, on the bundled data scaled up with synthetic copies of
+every asset and industry
+
+    python benchmarks/load_test.py [--modes sync threads] [--workers 2] [--threads 4] [--users 16] [--duration 20] [--scales 1 10 ...]
+
+For each scale and serving mode, gunicorn is started with gunicorn.conf.py
+and `--workers` workers, and `--users` simulated users use it at once.
+Each user opens the page, then explores it like a person would: mostly
+dragging the year slider across a few years, and sometimes switching the
+financing, treatment, tab, or measure, picking scenarios, or drilling down
+into an industry. For every change the user sends the callback requests
+the browser would, with the outputs of earlier responses applied to the
+inputs of later ones, and waits `--think` seconds between changes.
+
+The first `--warmup` seconds fill the caches of the workers and are not
+counted. The report gives the completed requests per second and their
+latency percentiles; errors are requests that failed or did not return
+200. Other settings of app.py, such as VIEW_CACHE, FRAME_STORAGE, or
+RESPONSE_CACHE_DIR, are taken from the environment.
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CURR_PATH = os.path.abspath(os.path.dirname(__file__))
+ROOT_PATH = os.path.dirname(CURR_PATH)
+sys.path.insert(0, ROOT_PATH)
+
+from bench_suite import write_synthetic  # noqa: E402
+
+# gunicorn.conf.py with a hook creating a file named by the pid of each
+# worker once it has loaded the app
+GUNICORN_CONFIG = """
+import os
+
+exec(open("gunicorn.conf.py").read())
+app_post_worker_init = globals().get("post_worker_init")
+
+
+def post_worker_init(worker):
+    if app_post_worker_init is not None:
+        app_post_worker_init(worker)
+    open(os.path.join(os.environ["READY_PATH"], str(worker.pid)), "w").close()
+"""
+# seconds to wait for the workers to load the app
+READY_TIMEOUT = 600
+# seconds to wait for one response
+REQUEST_TIMEOUT = 120
+
+SERVING_MODES = ["sync", "threads"]
+# relative frequency of each kind of change a user makes
+ACTIONS = {
+    "year": 6,
+    "financing": 1,
+    "treatment": 1,
+    "tabs": 1,
+    "measure": 1,
+    "scenarios": 0.5,
+    "industry": 0.5,
+}
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def layout_props(layout):
+    """
+    props of every component of a /_dash-layout tree by id; the values of
+    Tabs are the values of their Tab children
+    """
+    props = {}
+
+    def walk(node):
+        if isinstance(node, list):
+            for child in node:
+                walk(child)
+        elif isinstance(node, dict):
+            node_props = node.get("props", {})
+            if "id" in node_props:
+                props[node_props["id"]] = dict(node_props, type=node.get("type"))
+            walk(node_props.get("children"))
+
+    walk(layout)
+    for component in props.values():
+        if component["type"] == "Tabs":
+            children = component.get("children") or []
+            component["options"] = [
+                child["props"]["value"]
+                for child in children
+                if isinstance(child, dict) and "value" in child.get("props", {})
+            ]
+    return props
+
+
+def choices(component):
+    """
+    values a user can pick for a component's value
+    """
+    if component["type"] == "Slider":
+        return list(range(component["min"], component["max"] + 1, component["step"]))
+    return [
+        option["value"] if isinstance(option, dict) else option
+        for option in component.get("options") or []
+    ]
+
+
+def ready_workers(ready_path):
+    # a worker that died is replaced, so only count live ones
+    return sum(
+        os.path.exists("/proc/{}".format(name)) for name in os.listdir(ready_path)
+    )
+
+
+def run_user(port, deadline, start, think, seed, results):
+    """
+    simulate one user until deadline, appending (latency, ok) of every
+    request sent between start and deadline to results
+    """
+    rng = random.Random(seed)
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=REQUEST_TIMEOUT)
+
+    def send(method, path, body=None):
+        sent = time.monotonic()
+        try:
+            headers = {"Content-Type": "application/json"} if body else {}
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            data, ok = response.read(), response.status == 200
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            data, ok = None, False
+        if start <= sent < deadline:
+            results.append((time.monotonic() - sent, ok))
+        return data if ok else None
+
+    def change(props, deps, changed):
+        # the callbacks the browser fires for changed, None for page load
+        for dep in deps:
+            inputs = [
+                dict(item, value=props.get(item["id"], {}).get(item["property"]))
+                for item in dep["inputs"]
+            ]
+            if changed is not None and changed not in [
+                (item["id"], item["property"]) for item in inputs
+            ]:
+                continue
+            outputs = [
+                dict(zip(("id", "property"), output.split(".")))
+                for output in dep["output"].strip(".").split("...")
+            ]
+            body = {
+                "output": dep["output"],
+                "outputs": outputs if dep["output"].startswith("..") else outputs[0],
+                "inputs": inputs,
+                "state": [],
+                "changedPropIds": [".".join(changed)] if changed else [],
+            }
+            data = send("POST", "/_dash-update-component", json.dumps(body))
+            if data:
+                for id_, values in json.loads(data)["response"].items():
+                    props.setdefault(id_, {}).update(values)
+
+    try:
+        while time.monotonic() < deadline:
+            send("GET", "/")
+            props = layout_props(json.loads(send("GET", "/_dash-layout") or "null"))
+            deps = [
+                dep
+                for dep in json.loads(send("GET", "/_dash-dependencies") or "[]")
+                if not dep.get("clientside_function")
+            ]
+            if not props:
+                continue
+            change(props, deps, None)
+            for _ in range(rng.randint(5, 20)):
+                if time.monotonic() > deadline:
+                    break
+                names = [name for name in ACTIONS if name in props]
+                name = rng.choices(names, [ACTIONS[name] for name in names])[0]
+                component = props[name]
+                values = choices(component)
+                if name == "year":
+                    # drag the slider a few years, one change per year
+                    i = values.index(component["value"])
+                    j = rng.randrange(len(values))
+                    step = 1 if j > i else -1
+                    steps = [values[k] for k in range(i + step, j + step, step)]
+                elif name == "scenarios":
+                    # the baseline and at most one reform
+                    steps = [values[:1] + rng.sample(values[1:], rng.randint(0, 1))]
+                elif name == "industry":
+                    steps = [rng.choice(values + [None])]
+                else:
+                    steps = [rng.choice(values)]
+                for value in steps:
+                    component["value"] = value
+                    change(props, deps, (name, "value"))
+                time.sleep(think)
+    finally:
+        conn.close()
+
+
+def run_mode(env, mode, workers, threads, args, path):
+    """
+    start gunicorn in a serving mode, wait until every worker is ready,
+    and run the simulated users against it
+    """
+    config_path = os.path.join(path, "gunicorn_config.py")
+    with open(config_path, "w") as f:
+        f.write(GUNICORN_CONFIG)
+    ready_path = tempfile.mkdtemp(dir=path)
+    port = free_port()
+    proc = subprocess.Popen(
+        [
+            sys.executable,
+            "-W",
+            "ignore",
+            "-m",
+            "gunicorn",
+            "--config",
+            config_path,
+            "--bind",
+            "127.0.0.1:{}".format(port),
+            "--workers",
+            str(workers),
+            "--timeout",
+            "600",
+            "app:server",
+        ],
+        cwd=ROOT_PATH,
+        env=dict(
+            env,
+            READY_PATH=ready_path,
+            SERVING_MODE=mode,
+            SERVING_THREADS=str(threads),
+        ),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.monotonic() + READY_TIMEOUT
+        while ready_workers(ready_path) < workers:
+            if proc.poll() is not None:
+                sys.exit("gunicorn exited before its workers were ready")
+            if time.monotonic() > deadline:
+                sys.exit("gunicorn workers were not ready in time")
+            time.sleep(0.1)
+        results = []
+        start = time.monotonic() + args.warmup
+        deadline = start + args.duration
+        users = [
+            threading.Thread(
+                target=run_user,
+                args=(port, deadline, start, args.think, args.seed + i, results),
+            )
+            for i in range(args.users)
+        ]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+        return results
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def summarize(results, duration):
+    """
+    requests per second, errors, and latency percentiles in ms
+    """
+    latencies = sorted(latency * 1000 for latency, ok in results if ok)
+    if len(latencies) < 2:
+        latencies = (latencies or [float("nan")]) * 2
+    quantiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "requests": len(results),
+        "rps": len(results) / duration,
+        "errors": sum(1 for _, ok in results if not ok),
+        "p50": quantiles[49],
+        "p90": quantiles[89],
+        "p99": quantiles[98],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--modes", nargs="+", choices=SERVING_MODES, default=SERVING_MODES
+    )
+    parser.add_argument("--scales", type=int, nargs="+", default=[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=4,
+        help="threads of each worker with SERVING_MODE=threads",
+    )
+    parser.add_argument("--users", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20, help="seconds")
+    parser.add_argument("--warmup", type=float, default=10, help="seconds")
+    parser.add_argument(
+        "--think", type=float, default=0, help="seconds between a user's changes"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(
+        "{:>6} {:<8} {:>7} {:>7} {:>9} {:>8} {:>7} {:>9} {:>9} {:>9}".format(
+            "scale",
+            "mode",
+            "workers",
+            "threads",
+            "requests",
+            "req/s",
+            "errors",
+            "p50",
+            "p90",
+            "p99",
+        )
+    )
+    for scale in args.scales:
+        with tempfile.TemporaryDirectory() as path:
+            manifest_path = write_synthetic(path, scale)
+            prepared_path = os.path.join(path, "prepared")
+            env = dict(
+                os.environ,
+                SCENARIO_MANIFEST=manifest_path,
+                PREPARED_DATA_PATH=prepared_path,
+                INTERACTION_MODE="server",
+            )
+            for name in ("SCENARIO_DIR", "VIEW_CACHE_PATH", "STARTUP_PROFILE"):
+                env.pop(name, None)
+            subprocess.run(
+                [
+                    sys.executable,
+                    "-W",
+                    "ignore",
+                    "prepare.py",
+                    "--output",
+                    prepared_path,
+                ],
+                cwd=ROOT_PATH,
+                env=env,
+                check=True,
+                stdout=subprocess.DEVNULL,
+            )
+            for mode in args.modes:
+                threads = args.threads if mode == "threads" else 1
+                results = run_mode(env, mode, args.workers, threads, args, path)
+                result = summarize(results, args.duration)
+                print(
+                    "{:>6} {:<8} {:>7} {:>7} {:>9} {:>8.1f} {:>7} {:>7.1f}ms"
+                    " {:>7.1f}ms {:>7.1f}ms".format(
+                        scale,
+                        mode,
+                        args.workers,
+                        threads,
+                        result["requests"],
+                        result["rps"],
+                        result["errors"],
+                        result["p50"],
+                        result["p90"],
+                        result["p99"],
+                    ),
+                    flush=True,
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,191 @@
-import os
+import numpy as np
+import pandas as pd
 
+import app
 from app import server
+from cs_config import store
+
+# section of the model parameters shown on Compute Studio
+SECTION = "Dashboard"
 
 
 def get_version():
     return "version here"
 
+
+def parameter_choices():
+    """
+    allowed values of each dashboard parameter, the first being the default
+    """
+    reforms = [name for name in app.SCENARIOS if name != app.BASELINE]
+    return {
+        "scenario": reforms or [app.BASELINE],
+        "year": app.YEARS,
+        "financing": app.FINANCING,
+        "treatment": app.TREATMENTS,
+    }
+
+
+def model_parameters():
+    """
+    ParamTools specification of the dashboard parameters
+    """
+    choices = parameter_choices()
+    return {
+        "scenario": {
+            "title": "Reform scenario",
+            "description": "Policy compared with current law.",
+            "type": "str",
+            "value": [{"value": choices["scenario"][0]}],
+            "validators": {"choice": {"choices": choices["scenario"]}},
+        },
+        "year": {
+            "title": "Year",
+            "description": "Year of the marginal effective tax rates.",
+            "type": "int",
+            "value": [{"value": choices["year"][0]}],
+            "validators": {
+                "range": {"min": choices["year"][0], "max": choices["year"][-1]}
+            },
+        },
+        "financing": {
+            "title": "Financing",
+            "description": "How the investment is financed.",
+            "type": "str",
+            "value": [{"value": choices["financing"][0]}],
+            "validators": {"choice": {"choices": choices["financing"]}},
+        },
+        "treatment": {
+            "title": "Tax treatment",
+            "description": "Corporate, non-corporate, or overall tax treatment.",
+            "type": "str",
+            "value": [{"value": choices["treatment"][0]}],
+            "validators": {"choice": {"choices": choices["treatment"]}},
+        },
+    }
+
+
+def get_inputs(meta_param_dict):
+    return {"meta_parameters": {}, "model_parameters": {SECTION: model_parameters()}}
+
+
+def adjustment_values(values):
+    """
+    plain values of one parameter's adjustment, which may be a single value
+    or a list of values or of ParamTools value objects
+    """
+    if not isinstance(values, list):
+        values = [values]
+    return [v.get("value") if isinstance(v, dict) else v for v in values]
+
+
+def validate_inputs(meta_param_dict, adjustment, errors_warnings):
+    """
+    check the adjustment against the parameter specification
+    the values of each parameter are checked together as one array
+    """
+    specs = model_parameters()
+    for section, params in adjustment.items():
+        errors = errors_warnings.setdefault(section, {"errors": {}, "warnings": {}})
+        errors = errors["errors"]
+        if section != SECTION:
+            errors[section] = ["Unknown section: {}".format(section)]
+            continue
+        for name, values in params.items():
+            spec = specs.get(name)
+            if spec is None:
+                errors[name] = ["Unknown parameter: {}".format(name)]
+                continue
+            values = np.array(adjustment_values(values), dtype=object)
+            if spec["type"] == "int":
+                numbers = pd.to_numeric(pd.Series(values), errors="coerce")
+                limits = spec["validators"]["range"]
+                bad = (
+                    numbers.isna().to_numpy()
+                    | (numbers.to_numpy() % 1 != 0)
+                    | (numbers.to_numpy() < limits["min"])
+                    | (numbers.to_numpy() > limits["max"])
+                )
+                message = "{} {{}} must be an integer between {} and {}".format(
+                    name, limits["min"], limits["max"]
+                )
+            else:
+                choices = spec["validators"]["choice"]["choices"]
+                bad = ~np.isin(values.astype(str), choices)
+                message = "{} {{!r}} must be one of {}".format(name, ", ".join(choices))
+            if bad.any():
+                errors[name] = [message.format(value) for value in values[bad]]
+    return {"errors_warnings": errors_warnings}
+
+
+def resolve_params(adjustment):
+    """
+    value of each parameter: the last value in the adjustment, or the
+    default
+    """
+    params = {name: choices[0] for name, choices in parameter_choices().items()}
+    for name, values in adjustment.get(SECTION, {}).items():
+        values = adjustment_values(values)
+        if name in params and values:
+            params[name] = values[-1]
+    params["year"] = int(params["year"])
+    return params
+
+
+def build_result(params):
+    """
+    tables of the METRs of the baseline and the reform for params: a table
+    of the selected year per tab, and the tables of every year as CSVs
+    """
+    scenarios = [app.BASELINE]
+    if params["scenario"] != app.BASELINE:
+        scenarios.append(params["scenario"])
+    financing, treatment = params["financing"], params["treatment"]
+    subtitle = "{}, {}".format(
+        app.TREATMENT_LABELS[treatment], app.FINANCING_LABELS[financing]
+    )
+
+    renderable, downloadable = [], []
+    for tab, label in app.TAB_LABELS.items():
+        tables = [
+            app.get_view("frame", pol, financing, treatment, tab).set_index(label)
+            for pol in scenarios
+        ]
+        year_table = pd.concat(
+            [
+                table[str(params["year"])].rename(app.SCENARIOS[pol]["label"])
+                for pol, table in zip(scenarios, tables)
+            ],
+            axis=1,
+        ).reset_index()
+        renderable.append(
+            {
+                "media_type": "table",
+                "title": "METRs by {} in {} ({})".format(
+                    label, params["year"], subtitle
+                ),
+                "data": year_table.to_html(index=False, na_rep=""),
+            }
+        )
+        for pol, table in zip(scenarios, tables):
+            downloadable.append(
+                {
+                    "media_type": "CSV",
+                    "title": "{} METRs by {} ({})".format(
+                        app.SCENARIOS[pol]["label"], label, subtitle
+                    ),
+                    "data": table.reset_index().to_csv(index=False),
+                }
+            )
+    return {"renderable": renderable, "downloadable": downloadable}
+
+
+def run_model(meta_param_dict, adjustment):
+    """
+    answer from the store of precomputed results, building and storing
+    the result on a miss
+    """
+    return store.get_or_build(resolve_params(adjustment), build_result)
+
+
 dash = server
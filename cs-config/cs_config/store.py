@@ -0,0 +1,109 @@
+"""
+Store of precomputed Compute Studio results
+
+Results are stored as JSON files named by a hash of what they are built
+from: the contents of the scenarios' CSV inputs, the result version, the
+custom groupings, and the dashboard parameters. A changed input file
+therefore never serves an old result. Precompute the results of every
+parameter combination with:
+
+    python -m cs_config.store [--scenario NAME ...]
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+
+import app
+import shared_data
+from prepare import source_checksum
+
+# directory of stored results
+RESULT_STORE_PATH = os.environ.get(
+    "RESULT_STORE_PATH", os.path.join(app.CURR_PATH, "data", "results")
+)
+# bump when the layout of the results changes
+RESULT_VERSION = 1
+
+
+def result_key(params):
+    """
+    content address of the result for params, a dict of dashboard
+    parameter values; the custom groupings shown in the tables are
+    included as well
+    """
+    scenarios = [app.BASELINE, params["scenario"]]
+    h = hashlib.sha256(str(RESULT_VERSION).encode())
+    h.update(json.dumps(app.GROUPINGS, sort_keys=True).encode())
+    for name in scenarios:
+        h.update(source_checksum(app.SCENARIOS[name]).encode())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+def result_path(key):
+    return os.path.join(RESULT_STORE_PATH, key[:2], key + ".json")
+
+
+def get(key):
+    """
+    stored result for key, or None
+    """
+    try:
+        with open(result_path(key)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def put(key, result):
+    """
+    store a result; the file is written to a temporary name and renamed so
+    that concurrent runs never read a partial result
+    """
+    path = result_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    shared_data.write_file(path, lambda f: json.dump(result, f), "w")
+
+
+def get_or_build(params, build):
+    """
+    stored result for params, building and storing it with build(params)
+    when it is missing
+    """
+    key = result_key(params)
+    result = get(key)
+    if result is None:
+        result = build(params)
+        put(key, result)
+    return result
+
+
+def main(argv=None):
+    from cs_config.functions import build_result, parameter_choices
+
+    parser = argparse.ArgumentParser(description="Precompute Compute Studio results")
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="scenario to precompute (default: every scenario)",
+    )
+    args = parser.parse_args(argv)
+
+    choices = parameter_choices()
+    if args.scenario:
+        choices["scenario"] = args.scenario
+    names = list(choices)
+    n_built = 0
+    for values in itertools.product(*choices.values()):
+        params = dict(zip(names, values))
+        key = result_key(params)
+        if get(key) is None:
+            put(key, build_result(params))
+            n_built += 1
+    print("built {} results in {}".format(n_built, RESULT_STORE_PATH))
+
+
+if __name__ == "__main__":
+    main()
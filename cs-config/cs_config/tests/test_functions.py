@@ -8,6 +8,18 @@ class TestFunctions1(CoreTestFunctions):
     get_inputs = functions.get_inputs
     validate_inputs = functions.validate_inputs
     run_model = functions.run_model
-    ok_adjustment = {}  # your valid inputs here
-    bad_adjustment = {}  # your invalid inputs here
-
+    ok_adjustment = {
+        "Dashboard": {
+            "scenario": [{"value": "biden"}],
+            "year": [{"value": 2025}],
+            "financing": [{"value": "mettr_e"}],
+            "treatment": [{"value": "corporate"}],
+        }
+    }
+    bad_adjustment = {
+        "Dashboard": {
+            "scenario": [{"value": "unknown"}],
+            "year": [{"value": 2035}],
+            "financing": [{"value": "mettr"}],
+        }
+    }
@@ -0,0 +1,157 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from prepare import baseline_levels, calc_changes, group_metrs, weighted_totals
+
+
+def results(rows):
+    return pd.DataFrame(
+        rows,
+        columns=[
+            "asset_name",
+            "tax_treat",
+            "year",
+            "assets",
+            "mettr_d",
+            "mettr_e",
+            "mettr_mix",
+        ],
+    )
+
+
+@pytest.fixture
+def baseline():
+    # the overall rows are stacked from both treatments, so they repeat
+    return baseline_levels(
+        results(
+            [
+                ("Land", "overall", 2021, 100.0, 0.1, -0.2, 0.0),
+                ("Land", "overall", 2021, 100.0, 0.1, -0.2, 0.0),
+                ("Land", "corporate", 2021, 60.0, 0.2, 0.25, 0.3),
+            ]
+        ),
+        "asset_name",
+    )
+
+
+def test_baseline_levels(baseline):
+    assert baseline.index.names == ["asset_name", "tax_treat", "year"]
+    assert baseline.columns.tolist() == ["assets", "mettr_d", "mettr_e", "mettr_mix"]
+    assert len(baseline) == 2
+    assert baseline.loc[("Land", "overall", 2021), "assets"] == 100.0
+
+
+def test_calc_changes(baseline):
+    reform = results(
+        [
+            ("Land", "overall", 2021, 110.0, 0.05, -0.1, 0.1),
+            ("Land", "corporate", 2021, 60.0, 0.2, 0.25, 0.3),
+        ]
+    )
+    df = calc_changes(reform, baseline, "asset_name")
+    overall = df.iloc[0]
+    assert overall["assets_diff"] == pytest.approx(10.0)
+    assert overall["assets_pct"] == pytest.approx(10.0)
+    assert overall["mettr_d_diff"] == pytest.approx(-0.05)
+    assert overall["mettr_d_pct"] == pytest.approx(-50.0)
+    # relative to the size of a negative baseline, so a rise is positive
+    assert overall["mettr_e_diff"] == pytest.approx(0.1)
+    assert overall["mettr_e_pct"] == pytest.approx(50.0)
+    corporate = df.iloc[1]
+    for col in ["assets", "mettr_d", "mettr_e", "mettr_mix"]:
+        assert corporate[col + "_diff"] == 0.0
+        assert corporate[col + "_pct"] == 0.0
+    # the input is left as it was
+    assert "assets_diff" not in reform.columns
+
+
+def test_calc_changes_zero_baseline(baseline):
+    reform = results([("Land", "overall", 2021, 100.0, 0.1, -0.2, 0.1)])
+    df = calc_changes(reform, baseline, "asset_name")
+    assert df["mettr_mix_diff"].iloc[0] == pytest.approx(0.1)
+    assert np.isnan(df["mettr_mix_pct"].iloc[0])
+
+
+def test_calc_changes_missing_baseline(baseline):
+    # a row of an asset, treatment, or year the baseline does not have
+    reform = results(
+        [
+            ("Structures", "overall", 2021, 50.0, 0.1, 0.2, 0.3),
+            ("Land", "overall", 2022, 100.0, 0.1, -0.2, 0.0),
+        ]
+    )
+    df = calc_changes(reform, baseline, "asset_name")
+    for col in ["assets", "mettr_d", "mettr_e", "mettr_mix"]:
+        assert df[col + "_diff"].isna().all()
+        assert df[col + "_pct"].isna().all()
+
+
+@pytest.fixture
+def totals():
+    # corporate rows of the bundled baseline for 2021, with an overall row
+    # repeated as when it is stacked from both treatments
+    return weighted_totals(
+        results(
+            [
+                ("Land", "corporate", 2021, 3.586506e12, 0.0, 0.30393, 0.0),
+                ("Structures", "corporate", 2021, 8.927296e12, 0.0, 0.23004, 0.0),
+                ("Land", "overall", 2021, 4.0e12, 0.1, 0.2, 0.3),
+                ("Land", "overall", 2021, 4.0e12, 0.1, 0.2, 0.3),
+                ("Structures", "overall", 2021, 1.0e13, 0.3, 0.4, 0.5),
+            ]
+        ),
+        "asset_name",
+    )
+
+
+def group_rows(df, tax_treat):
+    return df[(df["tax_treat"] == tax_treat) & (df["year"] == 2021)]
+
+
+def test_weighted_totals(totals):
+    assert totals["names"] == ["Land", "Structures"]
+    assert totals["keys"] == [("corporate", 2021), ("overall", 2021)]
+    # assets and three weighted metrics for each of the two keys
+    assert totals["matrix"].shape == (2, 8)
+    assert totals["matrix"][0, 4] == 4.0e12
+
+
+def test_group_metrs(totals):
+    df = group_metrs(totals, {"Structures and land": ["Structures", "Land"]})
+    assert df.columns.tolist() == [
+        "name",
+        "assets",
+        "mettr_d",
+        "mettr_e",
+        "mettr_mix",
+        "tax_treat",
+        "year",
+    ]
+    corporate = group_rows(df, "corporate").iloc[0]
+    assert corporate["name"] == "Structures and land"
+    assert corporate["assets"] == pytest.approx(1.2513802e13)
+    assert corporate["mettr_e"] == pytest.approx(0.2512, abs=1e-4)
+    # the repeated overall row of Land is counted once
+    overall = group_rows(df, "overall").iloc[0]
+    assert overall["assets"] == pytest.approx(1.4e13)
+    assert overall["mettr_d"] == pytest.approx((0.4e12 + 3.0e12) / 1.4e13)
+
+
+def test_group_metrs_empty_group(totals):
+    df = group_metrs(totals, {"Nothing": [], "Unknown": ["Vehicles"]})
+    assert len(df) == 4
+    assert (df["assets"] == 0).all()
+    assert df[["mettr_d", "mettr_e", "mettr_mix"]].isna().all().all()
+
+
+def test_group_metrs_duplicate_members(totals):
+    once = group_metrs(totals, {"Group": ["Structures", "Land"]})
+    twice = group_metrs(totals, {"Group": ["Structures", "Land", "Land"]})
+    pd.testing.assert_frame_equal(once, twice)
+
+
+def test_group_metrs_no_groups(totals):
+    df = group_metrs(totals, {})
+    assert df.empty
+    assert df.columns.tolist()[:2] == ["name", "assets"]
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import app
+import shared_data
+from prepare import load_scenario
+
+
+def assert_same(mapped, built):
+    """
+    mapped equals built, which may nest frames, partitions, and arrays in
+    dicts
+    """
+    if isinstance(built, pd.DataFrame):
+        pd.testing.assert_frame_equal(mapped, built)
+    elif isinstance(built, np.ndarray):
+        np.testing.assert_array_equal(mapped, built)
+    elif isinstance(built, dict):
+        assert list(mapped) == list(built)
+        for key in built:
+            assert_same(mapped[key], built[key])
+    else:
+        assert mapped == built
+
+
+@pytest.fixture
+def indexed():
+    # shared storage keeps the frames like compact storage
+    baseline = app.SCENARIOS[app.BASELINE]
+    data = app.index_scenario(*load_scenario(baseline, compact=True))
+    reforms = [name for name in app.SCENARIOS if name != app.BASELINE]
+    reform = app.index_scenario(
+        *load_scenario(app.SCENARIOS[reforms[0]], compact=True), data
+    )
+    return {"baseline": data, "reform": reform}
+
+
+@pytest.mark.parametrize("name", ["baseline", "reform"])
+def test_round_trip(indexed, name, tmp_path, monkeypatch):
+    monkeypatch.setattr(shared_data, "SHARED_DATA_PATH", str(tmp_path))
+    built = indexed[name]
+    written = shared_data.get_or_build(name, "key", lambda: built)
+    # a later process maps what the first one wrote
+    mapped = shared_data.get_or_build(name, "key", pytest.fail)
+    for data in [written, mapped]:
+        assert data is not built
+        assert_same(data, built)
+    for tab in ["asset_tab", "industry_tab"]:
+        parts = mapped[tab]["table_index"]
+        assert all(not part.empty for part in parts.values())
+        assert isinstance(mapped[tab]["totals"]["matrix"], np.memmap)
+        assert not mapped[tab]["totals"]["matrix"].flags.writeable
+    if name == "baseline":
+        assert_same(mapped["asset_tab"]["levels"], built["asset_tab"]["levels"])
@@ -0,0 +1,60 @@
+import pandas as pd
+import pytest
+
+import app
+import shared_data
+
+
+@pytest.fixture(params=["full", "compact"])
+def table(request):
+    """
+    a table like the frame views of custom table mode; compact storage
+    keeps the names as categoricals
+    """
+    table = pd.DataFrame(
+        {
+            "Asset": ["Overall", "Land", "Structures"],
+            "2021": [0.25, 0.1, 0.3],
+            "2022": [0.2, 0.15, 0.35],
+        }
+    )
+    if request.param == "compact":
+        table["Asset"] = table["Asset"].astype("category")
+    return shared_data.read_only_frame(table)
+
+
+@pytest.mark.parametrize(
+    "filter_part, expected",
+    [
+        ("{2021} >= 0.2", ("2021", "ge", 0.2)),
+        ("{2021} ge 0.2", ("2021", "ge", 0.2)),
+        ("{Asset} = Land", ("Asset", "eq", "Land")),
+        ('{Asset} eq "Land"', ("Asset", "eq", "Land")),
+        ("{Asset} != 'Land'", ("Asset", "ne", "Land")),
+        ("{Asset} contains struct", ("Asset", "contains", "struct")),
+        ("{Asset}", (None, None, None)),
+    ],
+)
+def test_split_filter_part(filter_part, expected):
+    assert app.split_filter_part(filter_part) == expected
+
+
+@pytest.mark.parametrize(
+    "filter_query, expected",
+    [
+        ("", ["Overall", "Land", "Structures"]),
+        ('{Asset} = "Land"', ["Land"]),
+        ("{Asset} eq Land", ["Land"]),
+        ("{Asset} ne Land", ["Overall", "Structures"]),
+        ("{Asset} < M", ["Land"]),
+        ("{Asset} contains struct", ["Structures"]),
+        ("{Asset} datestartswith O", ["Overall"]),
+        ("{2021} >= 0.25", ["Overall", "Structures"]),
+        ("{2021} >= 0.2 && {2022} < 0.3", ["Overall"]),
+        ("{2021} = Land", []),
+        ("{Asset} = 0.1", []),
+        ("{Unknown} = 1 && {Asset} = Land", ["Land"]),
+    ],
+)
+def test_filter_table(table, filter_query, expected):
+    assert app.filter_table(table, filter_query)["Asset"].tolist() == expected
@@ -2,6 +2,6 @@ git clone https://github.com/Peter-Metz/ccc-widget
 cd ccc-widget
 
 conda install pandas plotly pip
-pip install dash gunicorn
+pip install "dash>=2.9" gunicorn flask-compress
 
 pip install -e .
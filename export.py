@@ -0,0 +1,266 @@
+"""
+Static export of every dashboard view
+
+Writes, for the baseline compared with each reform scenario, the figure
+JSON and a standalone HTML page for every tab, tax treatment, financing
+assumption, and year, and the table records of every tab, tax treatment,
+and financing assumption. index.json and index.html list the views, so a
+static host can serve the output directory as is:
+
+    python export.py [--output build] [--workers N] [--scenario NAME ...]
+
+Views are spread over a process pool, one task per tab, tax treatment,
+and financing assumption of each scenario comparison.
+"""
+import argparse
+import concurrent.futures
+import html
+import itertools
+import json
+import os
+import time
+
+# build views directly, without the view cache or a warm-up thread that
+# would not survive the fork into the pool's workers
+os.environ.setdefault("VIEW_CACHE", "off")
+os.environ.setdefault("STARTUP_WARMUP", "sync")
+
+import plotly.io  # noqa: E402
+import plotly.offline  # noqa: E402
+
+import app  # noqa: E402
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="../plotly.min.js"></script>
+<style>
+body {{ font-family: sans-serif; margin: 20px; }}
+table {{ border-collapse: collapse; margin-bottom: 30px; }}
+th, td {{ border: 1px solid #ddd; padding: 4px 8px; text-align: right; }}
+th:first-child, td:first-child {{ text-align: left; }}
+</style>
+</head>
+<body>
+<h3>{title}</h3>
+{figure}
+{tables}
+</body>
+</html>
+"""
+
+INDEX_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Marginal Effective Tax Rates on Capital</title>
+</head>
+<body>
+{sections}
+</body>
+</html>
+"""
+
+
+def comparisons(names):
+    """
+    scenario selections to export: the baseline with each reform, or the
+    baseline alone when there is no reform
+    """
+    reforms = [name for name in names if name != app.BASELINE]
+    if not reforms:
+        return [(app.BASELINE,)]
+    return [(app.BASELINE, reform) for reform in reforms]
+
+
+def view_name(tab, treatment, financing, year=None):
+    return "-".join([tab, treatment, financing, str(year or "table")])
+
+
+def html_table(title, columns, records):
+    rows = [
+        "<tr>" + "".join("<th>{}</th>".format(html.escape(c["name"])) for c in columns)
+    ]
+    for record in records:
+        cells = []
+        for column in columns:
+            # year columns are ints in the records and strings in the columns
+            value = record.get(column["id"], record.get(_int(column["id"])))
+            cells.append("<td>{}</td>".format(html.escape(_format(value))))
+        rows.append("<tr>" + "".join(cells))
+    return "<h4>{}</h4>\n<table>\n{}\n</table>".format(
+        html.escape(title), "\n".join(rows)
+    )
+
+
+def _int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def _format(value):
+    if value is None or value != value:
+        return ""
+    return str(value)
+
+
+def export_views(output, scenarios, tab, treatment, financing):
+    """
+    write the table and the figure and page of every year for one tab,
+    tax treatment, and financing assumption of a scenario comparison
+    returns the index entries of the written views
+    """
+    reform = app.reform_scenario(scenarios)
+    directory = "-".join(scenarios)
+    os.makedirs(os.path.join(output, directory), exist_ok=True)
+
+    table = app.make_table_view(financing, treatment, tab, reform)
+    table_path = os.path.join(directory, view_name(tab, treatment, financing) + ".json")
+    with open(os.path.join(output, table_path), "w") as f:
+        f.write(
+            plotly.io.json.to_json_plotly(
+                {
+                    "columns": table[0],
+                    "base": table[1],
+                    "reform": table[3],
+                    "reform_label": app.SCENARIOS[reform]["label"] if reform else None,
+                }
+            )
+        )
+    tables = html_table(app.SCENARIOS[app.BASELINE]["label"], table[0], table[1])
+    if reform is not None:
+        tables += "\n" + html_table(app.SCENARIOS[reform]["label"], table[2], table[3])
+
+    entries = []
+    for year in app.YEARS:
+        fig = app.make_figure_view(year, financing, treatment, tab, scenarios)
+        name = view_name(tab, treatment, financing, year)
+        figure_path = os.path.join(directory, name + ".json")
+        with open(os.path.join(output, figure_path), "w") as f:
+            f.write(plotly.io.json.to_json_plotly(fig))
+
+        title = "{} by {}, {}, {}, {}".format(
+            " vs. ".join(app.SCENARIOS[pol]["label"] for pol in scenarios),
+            app.TAB_LABELS[tab],
+            app.TREATMENT_LABELS[treatment],
+            app.FINANCING_LABELS[financing],
+            year,
+        )
+        page_path = os.path.join(directory, name + ".html")
+        with open(os.path.join(output, page_path), "w") as f:
+            f.write(
+                PAGE.format(
+                    title=html.escape(title),
+                    figure=plotly.io.to_html(
+                        fig, include_plotlyjs=False, full_html=False
+                    ),
+                    tables=tables,
+                )
+            )
+        entries.append(
+            {
+                "scenarios": list(scenarios),
+                "tab": tab,
+                "treatment": treatment,
+                "financing": financing,
+                "year": year,
+                "title": title,
+                "figure": figure_path,
+                "page": page_path,
+                "table": table_path,
+            }
+        )
+    return entries
+
+
+def write_index(output, entries):
+    with open(os.path.join(output, "index.json"), "w") as f:
+        json.dump(
+            {
+                "baseline": app.BASELINE,
+                "scenarios": {
+                    name: scenario["label"] for name, scenario in app.SCENARIOS.items()
+                },
+                "years": app.YEARS,
+                "financing": app.FINANCING,
+                "treatments": app.TREATMENTS,
+                "tabs": app.TABS,
+                "views": entries,
+            },
+            f,
+            indent=1,
+        )
+
+    sections = []
+    for scenarios, views in itertools.groupby(entries, lambda e: e["scenarios"]):
+        links = [
+            '<li><a href="{}">{}</a></li>'.format(
+                html.escape(view["page"]), html.escape(view["title"])
+            )
+            for view in views
+        ]
+        sections.append(
+            "<h3>{}</h3>\n<ul>\n{}\n</ul>".format(
+                html.escape(
+                    " vs. ".join(app.SCENARIOS[pol]["label"] for pol in scenarios)
+                ),
+                "\n".join(links),
+            )
+        )
+    with open(os.path.join(output, "index.html"), "w") as f:
+        f.write(INDEX_PAGE.format(sections="\n".join(sections)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export every dashboard view")
+    parser.add_argument("--output", default=os.path.join(app.CURR_PATH, "build"))
+    parser.add_argument(
+        "--workers", type=int, default=os.cpu_count(), help="size of the process pool"
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="export comparisons with these scenarios only (default: all)",
+    )
+    args = parser.parse_args(argv)
+
+    names = args.scenario or list(app.SCENARIOS)
+    unknown = set(names) - set(app.SCENARIOS)
+    if unknown:
+        parser.error("unknown scenario(s): " + ", ".join(sorted(unknown)))
+
+    start = time.perf_counter()
+    os.makedirs(args.output, exist_ok=True)
+    with open(os.path.join(args.output, "plotly.min.js"), "w") as f:
+        f.write(plotly.offline.get_plotlyjs())
+
+    tasks = [
+        (args.output, scenarios, tab, treatment, financing)
+        for scenarios in comparisons(names)
+        for tab in app.TABS
+        for treatment in app.TREATMENTS
+        for financing in app.FINANCING
+    ]
+    with concurrent.futures.ProcessPoolExecutor(args.workers) as pool:
+        entries = [
+            entry
+            for entries in pool.map(export_views, *zip(*tasks))
+            for entry in entries
+        ]
+    write_index(args.output, entries)
+    print(
+        "exported {} views of {} scenario comparisons to {} in {:.1f}s".format(
+            len(entries),
+            len(comparisons(names)),
+            args.output,
+            time.perf_counter() - start,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+"""
+gunicorn settings for app.py, read from gunicorn.conf.py in the working
+directory, so `gunicorn app:server` picks them up
+
+SERVING_MODE=sync (default) serves one request at a time in each worker
+process. SERVING_MODE=threads serves up to SERVING_THREADS requests at
+once in each worker with gunicorn's gthread workers; the threads share the
+worker's scenario data and cached views, which are read-only. The number
+of workers is set by WEB_CONCURRENCY or --workers in both modes.
+"""
+import os
+
+SERVING_MODE = os.environ.get("SERVING_MODE", "sync")
+# requests served at once by each worker with SERVING_MODE=threads
+SERVING_THREADS = int(os.environ.get("SERVING_THREADS", "4"))
+
+if SERVING_MODE == "threads":
+    worker_class = "gthread"
+    threads = SERVING_THREADS
+
+    def post_worker_init(worker):
+        # pandas and numpy are imported lazily, which is not thread-safe,
+        # so finish importing them before the threads serve requests
+        import startup
+
+        startup.load_lazy_modules()
+
+elif SERVING_MODE != "sync":
+    raise ValueError("unknown SERVING_MODE: {}".format(SERVING_MODE))
@@ -0,0 +1,205 @@
+"""
+Callback metrics for app.py in the Prometheus text format
+
+With METRICS=1, app.py times the phases of building each callback's
+outputs (filter, group, pivot, figure, the whole callback function, and
+serialize, the rest of the request) and the latency and response size of
+each callback request, labeled by tab and tax treatment. register()
+serves them as histograms at METRICS_PATH on the Flask server. When
+disabled, the timers are shared no-op context managers and no request
+hooks are installed.
+
+Each process keeps its own metrics, so with several gunicorn workers a
+scrape sees the worker that answered it.
+"""
+import bisect
+import contextlib
+import os
+import threading
+import time
+
+# collect and serve metrics
+METRICS_ENABLED = os.environ.get("METRICS", "") not in ("", "0")
+# path of the metrics endpoint
+METRICS_PATH = os.environ.get("METRICS_PATH", "/metrics")
+
+SECONDS_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5]
+BYTES_BUCKETS = [1e3, 3e3, 1e4, 3e4, 1e5, 3e5, 1e6, 3e6, 1e7]
+
+# name -> (help text, bucket upper bounds)
+HISTOGRAMS = {
+    "ccc_phase_seconds": (
+        "Time spent in each phase of building callback outputs",
+        SECONDS_BUCKETS,
+    ),
+    "ccc_callback_seconds": (
+        "Latency of callback requests, including serialization",
+        SECONDS_BUCKETS,
+    ),
+    "ccc_callback_bytes": ("Size of callback responses", BYTES_BUCKETS),
+}
+
+# (name, label items) -> [count per bucket..., count in +Inf, sum]
+series = {}
+series_lock = threading.Lock()
+# seconds spent in callback functions during the current request
+local = threading.local()
+# label -> the values it may take, set by register(); other values, which
+# come from clients, are recorded as "other" so that a client can neither
+# add series nor forge lines of the exposition
+label_values = {}
+
+NULL_TIMER = contextlib.nullcontext()
+
+
+def observe(name, value, **labels):
+    """
+    add one observation to histogram name
+    """
+    buckets = HISTOGRAMS[name][1]
+    labels = {label: clean_label(label, value) for label, value in labels.items()}
+    key = (name, tuple(sorted(labels.items())))
+    with series_lock:
+        counts = series.get(key)
+        if counts is None:
+            counts = series[key] = [0] * (len(buckets) + 1) + [0.0]
+        counts[bisect.bisect_left(buckets, value)] += 1
+        counts[-1] += value
+
+
+@contextlib.contextmanager
+def _timer(name, callback, labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(name, elapsed, **labels)
+        if callback:
+            local.callback_seconds = getattr(local, "callback_seconds", 0) + elapsed
+
+
+def timer(phase, **labels):
+    """
+    context manager timing one phase of building callback outputs
+    """
+    if not METRICS_ENABLED:
+        return NULL_TIMER
+    return _timer("ccc_phase_seconds", False, dict(labels, phase=phase))
+
+
+def callback_timer(**labels):
+    """
+    context manager timing the body of a callback function; the rest of
+    the request is recorded as the serialize phase
+    """
+    if not METRICS_ENABLED:
+        return NULL_TIMER
+    return _timer("ccc_phase_seconds", True, dict(labels, phase="callback"))
+
+
+def clean_label(label, value):
+    allowed = label_values.get(label)
+    if allowed is None or (isinstance(value, str) and value in allowed):
+        return value
+    return "other"
+
+
+def escape_label(value):
+    # backslash, double quote, and newline are escaped in label values
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_labels(labels, **extra):
+    items = list(labels) + list(extra.items())
+    if not items:
+        return ""
+    return "{" + ",".join('{}="{}"'.format(k, escape_label(v)) for k, v in items) + "}"
+
+
+def render():
+    """
+    all histograms in the Prometheus text exposition format
+    """
+    with series_lock:
+        snapshot = {key: list(counts) for key, counts in series.items()}
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append("# HELP {} {}".format(name, help_text))
+        lines.append("# TYPE {} histogram".format(name))
+        for (series_name, labels), counts in sorted(snapshot.items()):
+            if series_name != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(buckets + ["+Inf"], counts):
+                cumulative += count
+                lines.append(
+                    "{}_bucket{} {}".format(
+                        name, format_labels(labels, le=bound), cumulative
+                    )
+                )
+            lines.append("{}_sum{} {}".format(name, format_labels(labels), counts[-1]))
+            lines.append(
+                "{}_count{} {}".format(name, format_labels(labels), cumulative)
+            )
+    return "\n".join(lines) + "\n"
+
+
+def request_labels(body):
+    """
+    callback, tab, and treatment labels of a Dash callback request
+    """
+    values = {item.get("id"): item.get("value") for item in body.get("inputs", [])}
+    return {
+        "callback": body.get("output", "").strip(".").split(".")[0],
+        "tab": values.get("tabs", ""),
+        "treatment": values.get("treatment", ""),
+    }
+
+
+def register(server, **allowed):
+    """
+    time callback requests on the Flask server and serve the metrics
+    allowed maps labels to the values they may take, such as the tabs
+    for tab; other values are recorded as "other"
+    """
+    if not METRICS_ENABLED:
+        return
+    # a label is empty when the request has no such input
+    label_values.update(
+        (label, set(values) | {""}) for label, values in allowed.items()
+    )
+    import flask
+
+    @server.before_request
+    def start_request():
+        if flask.request.path.endswith("/_dash-update-component"):
+            flask.g.metrics_start = time.perf_counter()
+            local.callback_seconds = 0
+
+    @server.after_request
+    def finish_request(response):
+        start = flask.g.pop("metrics_start", None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        labels = request_labels(flask.request.get_json(silent=True) or {})
+        observe("ccc_callback_seconds", elapsed, **labels)
+        observe(
+            "ccc_callback_bytes", response.calculate_content_length() or 0, **labels
+        )
+        if local.callback_seconds:
+            observe(
+                "ccc_phase_seconds",
+                elapsed - local.callback_seconds,
+                tab=labels["tab"],
+                treatment=labels["treatment"],
+                phase="serialize",
+            )
+        return response
+
+    server.add_url_rule(
+        METRICS_PATH,
+        "metrics",
+        lambda: flask.Response(render(), mimetype="text/plain; version=0.0.4"),
+    )
@@ -0,0 +1,583 @@
+"""
+Data preparation for app.py
+
+Scenarios (current law, the Biden proposal, and any other reform) are
+listed in data/scenarios.json or discovered in a directory of
+Cost-of-Capital-Calculator output. For each scenario the asset and
+industry results are read and the overall tax treatment is computed.
+Industry results keep the overall total and the major industries, and,
+with DETAILED_INDUSTRIES=1, the detailed industries within each major
+industry as well.
+Running this module writes the prepared frames of every scenario to a
+columnar artifact that app.py loads instead of repeating the pipeline:
+
+    python prepare.py [--output data/prepared] [--scenario NAME ...]
+"""
+import argparse
+import collections
+import hashlib
+import json
+import os
+import warnings
+
+import shared_data
+from startup import lazy_import
+
+# numpy and pandas are imported on first use, when a scenario is loaded
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+CURR_PATH = os.path.abspath(os.path.dirname(__file__))
+
+# manifest listing the result files of each scenario
+SCENARIO_MANIFEST = os.environ.get(
+    "SCENARIO_MANIFEST", os.path.join(CURR_PATH, "data/scenarios.json")
+)
+# optional directory scanned for <name>_assets.csv and <name>_industry.csv
+SCENARIO_DIR = os.environ.get("SCENARIO_DIR")
+
+# marker and hover label colors for scenarios that do not set their own
+SCENARIO_COLORS = [
+    ("#6495ED", "#abc6f7"),
+    ("#FF7F50", "#ffb396"),
+    ("#3CB371", "#9ed9b8"),
+    ("#9370DB", "#c9b7ed"),
+    ("#DAA520", "#ecd28f"),
+    ("#CD5C5C", "#e6adad"),
+    ("#20B2AA", "#8fd8d4"),
+    ("#708090", "#b7bfc7"),
+]
+
+# directory holding the prepared artifact
+PREPARED_DATA_PATH = os.environ.get(
+    "PREPARED_DATA_PATH", os.path.join(CURR_PATH, "data/prepared")
+)
+# bump when the pipeline or the artifact layout changes
+PREPARED_VERSION = 2
+
+# METR columns reported for each financing assumption
+METRICS = ["mettr_d", "mettr_e", "mettr_mix"]
+
+# columns read from the Cost-of-Capital-Calculator output; the rest of a
+# file is never loaded
+ASSET_COLUMNS = ["asset_name", "assets"] + METRICS + ["tax_treat", "ucc_mix", "year"]
+INDUSTRY_COLUMNS = ["Industry", "assets", "major_industry"] + METRICS
+INDUSTRY_COLUMNS += ["tax_treat", "year"]
+# columns whose change from the baseline is computed for every reform
+CHANGE_COLUMNS = ["assets"] + METRICS
+# rows of a CSV input parsed at a time
+CSV_CHUNK_ROWS = int(os.environ.get("CSV_CHUNK_ROWS", "100000"))
+# keep the detailed industries within each major industry, which the
+# industry tab drills down into; they are most of the rows of an industry
+# file, so only the major industries are kept by default
+DETAILED_INDUSTRIES = os.environ.get("DETAILED_INDUSTRIES", "0") not in ("", "0")
+
+
+def sum_overall_treat(df, var, metrics=METRICS):
+    """
+    asset-weighted METRs, summed alongside total asset size
+    grouped by asset/industry, year, and policy
+    totals of separate chunks of rows add up to the totals of all rows
+    """
+    totals = df[metrics].mul(df["assets"], axis=0)
+    totals["assets"] = df["assets"]
+    return totals.groupby([df[key] for key in [var, "year", "policy"]]).sum()
+
+
+def calc_overall_treat(df, var, metrics=METRICS, totals=None):
+    """
+    Overall tax treatment is calculated by taking a weighted average
+    of corporate and non-corporate METRs (weighted by asset size)
+
+    The asset-weighted totals of every metric and the asset totals are
+    summed in a single grouped reduction, or taken from totals when they
+    were summed while the rows were read, and broadcast back onto the
+    rows, adding a `<metric>_ovr` column per metric plus `assets_ovr`
+    """
+    keys = [var, "year", "policy"]
+    df = df.reset_index(drop=True)
+
+    if totals is None:
+        totals = sum_overall_treat(df, var, metrics)
+    # the totals of each row's group
+    totals = totals.reindex(pd.MultiIndex.from_frame(df[keys]))
+    totals = totals.reset_index(drop=True)
+
+    # calculate weighted average of corporate/non-corporate METRs
+    ovr = totals[metrics].div(totals["assets"], axis=0)
+    ovr.columns = [mettr + "_ovr" for mettr in metrics]
+    df[ovr.columns] = ovr
+    # total size of asset
+    df["assets_ovr"] = totals["assets"]
+
+    return df.sort_values("assets_ovr")
+
+
+def weighted_totals(df, var, metrics=METRICS):
+    """
+    asset totals and asset-weighted METR totals of df as a dense matrix
+    with a row per asset or industry name and, for each (tax_treat, year),
+    a column of the assets followed by a column per metric
+    rows repeated within a (name, tax_treat, year), like the overall rows
+    stacked from both treatments, are counted once
+    returns a dict of the names, the (tax_treat, year) keys, and the matrix
+    """
+    names = pd.Categorical(df[var])
+    key_codes, keys = pd.factorize(
+        pd.MultiIndex.from_frame(df[["tax_treat", "year"]]), sort=True
+    )
+    assets = df["assets"].to_numpy(dtype=np.float64)
+    values = np.column_stack(
+        [assets] + [df[mettr].to_numpy(dtype=np.float64) * assets for mettr in metrics]
+    )
+    matrix = np.zeros((len(names.categories), len(keys), values.shape[1]))
+    matrix[names.codes, key_codes] = values
+    return {
+        "names": names.categories.tolist(),
+        "keys": keys.tolist(),
+        "matrix": matrix.reshape(len(names.categories), -1),
+    }
+
+
+def group_metrs(totals, groups, metrics=METRICS):
+    """
+    asset-weighted METRs of groups of assets or industries for every tax
+    treatment and year, from the totals of weighted_totals
+    groups maps each group name to a list of member names; members missing
+    from the data are ignored
+    group membership is a sparse matrix, kept as its (group, name) pairs,
+    and every group total comes from one product of it with the totals
+    matrix
+    returns a frame with a row per group, tax_treat, and year
+    """
+    index = {name: i for i, name in enumerate(totals["names"])}
+    pairs = [
+        (g, index[name])
+        for g, members in enumerate(groups.values())
+        for name in set(members)
+        if name in index
+    ]
+    pair_groups, pair_names = np.array(pairs, dtype=np.intp).reshape(-1, 2).T
+    sums = np.zeros((len(groups), totals["matrix"].shape[1]))
+    np.add.at(sums, pair_groups, totals["matrix"][pair_names])
+
+    keys = totals["keys"]
+    sums = sums.reshape(len(groups) * len(keys), len(metrics) + 1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        metrs = sums[:, 1:] / sums[:, :1]
+    df = pd.DataFrame(metrs, columns=metrics)
+    df.insert(0, "name", np.repeat(list(groups), len(keys)))
+    df.insert(1, "assets", sums[:, 0])
+    df["tax_treat"] = [treat for treat, _ in keys] * len(groups)
+    df["year"] = [year for _, year in keys] * len(groups)
+    return df
+
+
+def baseline_levels(df, var, columns=CHANGE_COLUMNS):
+    """
+    values of the baseline indexed by (var, tax_treat, year), the operand
+    of calc_changes; repeated rows, like the overall rows stacked from
+    both treatments, are kept once
+    """
+    keys = [var, "tax_treat", "year"]
+    levels = df.drop_duplicates(keys).set_index(keys)[columns]
+    return levels.astype(np.float64)
+
+
+def calc_changes(df, baseline, var, columns=CHANGE_COLUMNS):
+    """
+    change of every row of df from the baseline: a `<column>_diff` column
+    with the difference and a `<column>_pct` column with the percent change
+    for the assets and each METR
+    baseline holds the baseline values indexed by (var, tax_treat, year),
+    as from baseline_levels; the percent change is relative to the size of
+    the baseline value, so its sign is the sign of the difference, and is
+    NaN where the baseline value is 0 or missing
+    returns a copy of df with the columns added
+    """
+    base = baseline.reindex(pd.MultiIndex.from_frame(df[[var, "tax_treat", "year"]]))
+    base = base[columns].to_numpy()
+    diff = df[columns].to_numpy(dtype=np.float64) - base
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct = np.where(base == 0, np.nan, 100 * diff / np.abs(base))
+    df = df.copy()
+    for i, col in enumerate(columns):
+        df[col + "_diff"] = diff[:, i]
+        df[col + "_pct"] = pct[:, i]
+    return df
+
+
+def industry_level(df):
+    """
+    level of each industry row in the hierarchy: "overall" for the total
+    of all industries, "major" for a major industry, and "detailed" for an
+    industry within a major industry
+    """
+    return np.where(
+        df["Industry"] == "Overall",
+        "overall",
+        np.where(df["Industry"] == df["major_industry"], "major", "detailed"),
+    )
+
+
+def is_major(df):
+    """
+    whether each industry row is the overall total or a major industry
+    """
+    return industry_level(df) != "detailed"
+
+
+def load_registry(manifest_path=SCENARIO_MANIFEST, scenario_dir=SCENARIO_DIR):
+    """
+    discover scenarios from the manifest and, optionally, from a directory
+    of <name>_assets.csv / <name>_industry.csv pairs
+    returns a dict with the baseline scenario name, the scenarios shown by
+    default, and an ordered dict of name -> scenario
+    """
+    manifest = {"scenarios": []}
+    if manifest_path and os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path or CURR_PATH))
+
+    entries = [
+        dict(
+            entry,
+            assets=os.path.join(manifest_dir, entry["assets"]),
+            industry=os.path.join(manifest_dir, entry["industry"]),
+        )
+        for entry in manifest["scenarios"]
+    ]
+    if scenario_dir:
+        for fname in sorted(os.listdir(scenario_dir)):
+            if not fname.endswith("_assets.csv"):
+                continue
+            name = fname[: -len("_assets.csv")]
+            industry_path = os.path.join(scenario_dir, name + "_industry.csv")
+            if os.path.exists(industry_path):
+                entries.append(
+                    {
+                        "name": name,
+                        "assets": os.path.join(scenario_dir, fname),
+                        "industry": industry_path,
+                    }
+                )
+
+    scenarios = collections.OrderedDict()
+    for entry in entries:
+        if entry["name"] in scenarios:
+            continue
+        color, hover_color = SCENARIO_COLORS[len(scenarios) % len(SCENARIO_COLORS)]
+        scenarios[entry["name"]] = {
+            "name": entry["name"],
+            "label": entry.get("label", entry["name"]),
+            "asset_path": entry["assets"],
+            "industry_path": entry["industry"],
+            "color": entry.get("color", color),
+            "hover_color": entry.get("hover_color", hover_color),
+        }
+    if not scenarios:
+        raise ValueError("no scenarios found in {}".format(manifest_path))
+
+    baseline = manifest.get("baseline", next(iter(scenarios)))
+    default = manifest.get("default")
+    if default is None:
+        default = [baseline] + [name for name in scenarios if name != baseline][:1]
+    return {"baseline": baseline, "default": default, "scenarios": scenarios}
+
+
+def read_results(path, columns, var, policy, row_filter=None):
+    """
+    stream a CSV of Cost-of-Capital-Calculator output in chunks, keeping
+    only the needed columns and the rows selected by row_filter, and sum
+    the overall tax treatment totals chunk by chunk
+    returns the kept rows with the overall tax treatment columns added
+    """
+    chunks, totals = [], []
+    for chunk in pd.read_csv(path, usecols=columns, chunksize=CSV_CHUNK_ROWS):
+        if row_filter is not None:
+            chunk = chunk.loc[row_filter(chunk)]
+        chunk["policy"] = policy
+        chunks.append(chunk)
+        totals.append(sum_overall_treat(chunk, var))
+    totals = pd.concat(totals).groupby(level=[0, 1, 2]).sum()
+    return calc_overall_treat(pd.concat(chunks), var, totals=totals)
+
+
+def prepare_scenario(scenario):
+    """
+    run the full pipeline on the CSV inputs of one scenario
+    returns the stacked asset and industry frames; the industry frame
+    holds the levels of the industry hierarchy (see industry_level) kept
+    by DETAILED_INDUSTRIES
+    """
+    # read Cost-of-Capital-Calculator output
+    # by asset...
+    asset_df_all = read_results(
+        scenario["asset_path"], ASSET_COLUMNS, "asset_name", scenario["name"]
+    )
+
+    # create separate dataframe for overall tax treatment
+    asset_df_overall = pd.DataFrame()
+    asset_df_overall["asset_name"] = asset_df_all["asset_name"]
+    asset_df_overall["assets"] = asset_df_all["assets_ovr"]
+    asset_df_overall["mettr_d"] = asset_df_all["mettr_d_ovr"]
+    asset_df_overall["mettr_e"] = asset_df_all["mettr_e_ovr"]
+    asset_df_overall["mettr_mix"] = asset_df_all["mettr_mix_ovr"]
+    asset_df_overall["tax_treat"] = "overall"
+    asset_df_overall["year"] = asset_df_all["year"]
+    asset_df_overall["policy"] = asset_df_all["policy"]
+
+    asset_df_all = asset_df_all.drop(
+        [
+            "assets_ovr",
+            "mettr_d_ovr",
+            "mettr_e_ovr",
+            "mettr_mix_ovr",
+        ],
+        axis=1,
+    )
+    # stack original df and overall tax treatment df
+    asset_df = pd.concat([asset_df_all, asset_df_overall])
+
+    # by industry, with the detailed industries of each major industry
+    # only when they are kept
+    industry_df_all = read_results(
+        scenario["industry_path"],
+        INDUSTRY_COLUMNS,
+        "Industry",
+        scenario["name"],
+        row_filter=None if DETAILED_INDUSTRIES else is_major,
+    )
+    industry_df_all["level"] = industry_level(industry_df_all)
+
+    # create separate dataframe for overall tax treatment
+    industry_df_overall = pd.DataFrame()
+    industry_df_overall["Industry"] = industry_df_all["Industry"]
+    industry_df_overall["major_industry"] = industry_df_all["major_industry"]
+    industry_df_overall["assets"] = industry_df_all["assets_ovr"]
+    industry_df_overall["mettr_d"] = industry_df_all["mettr_d_ovr"]
+    industry_df_overall["mettr_e"] = industry_df_all["mettr_e_ovr"]
+    industry_df_overall["mettr_mix"] = industry_df_all["mettr_mix_ovr"]
+    industry_df_overall["tax_treat"] = "overall"
+    industry_df_overall["year"] = industry_df_all["year"]
+    industry_df_overall["policy"] = industry_df_all["policy"]
+    industry_df_overall["level"] = industry_df_all["level"]
+    industry_df_overall.drop_duplicates(inplace=True)
+
+    industry_df_all = industry_df_all.drop(
+        [
+            "assets_ovr",
+            "mettr_d_ovr",
+            "mettr_e_ovr",
+            "mettr_mix_ovr",
+        ],
+        axis=1,
+    )
+    # stack original df and overall tax treatment df
+    industry_df = pd.concat([industry_df_all, industry_df_overall])
+
+    return asset_df.reset_index(drop=True), industry_df.reset_index(drop=True)
+
+
+# (path, size, mtime) of a scenario's CSV inputs -> their checksum
+source_checksums = {}
+
+
+def source_stats(scenario):
+    """
+    path, size, and mtime of a scenario's CSV inputs, recorded in the
+    artifact's manifest.json to tell whether the files changed since
+    """
+    stats = []
+    for path in [scenario["asset_path"], scenario["industry_path"]]:
+        st = os.stat(path)
+        stats.append([path, st.st_size, st.st_mtime_ns])
+    return stats
+
+
+def source_checksum(scenario, prepared_path=PREPARED_DATA_PATH):
+    """
+    checksum of a scenario's CSV inputs, the artifact version, and
+    DETAILED_INDUSTRIES, used to detect stale artifacts
+    the files are only hashed when their size or mtime differ from those
+    recorded with the scenario's artifact in prepared_path, so checking a
+    valid artifact does not read the raw files again
+    """
+    stats = source_stats(scenario)
+    signature = tuple(map(tuple, stats))
+    checksum = source_checksums.get(signature)
+    if checksum is None:
+        manifest = read_manifest(os.path.join(prepared_path, scenario["name"]))
+        if (
+            manifest is not None
+            and manifest.get("version") == PREPARED_VERSION
+            and manifest.get("detailed_industries") == DETAILED_INDUSTRIES
+            and manifest.get("sources") == stats
+        ):
+            checksum = manifest["checksum"]
+        else:
+            h = hashlib.sha256(str(PREPARED_VERSION).encode())
+            h.update(str(DETAILED_INDUSTRIES).encode())
+            for path, _, _ in stats:
+                with open(path, "rb") as f:
+                    for block in iter(lambda: f.read(2 ** 20), b""):
+                        h.update(block)
+            checksum = h.hexdigest()
+        source_checksums[signature] = checksum
+    return checksum
+
+
+def write_prepared(frames, path, checksum, sources=None):
+    """
+    write frames, a dict of name -> DataFrame, as one .npy file per column
+    string columns are stored as categorical codes with the categories in
+    manifest.json, which is written last so that a partial write is never
+    picked up as a valid artifact
+    sources, from source_stats, are the inputs the checksum was taken of
+    """
+    os.makedirs(path, exist_ok=True)
+    manifest = {
+        "version": PREPARED_VERSION,
+        "checksum": checksum,
+        "detailed_industries": DETAILED_INDUSTRIES,
+        "sources": sources or [],
+        "frames": {},
+    }
+    for name, df in frames.items():
+        columns = []
+        for col in df.columns:
+            fname = "{}.{}.npy".format(name, col)
+            column = {"name": col, "file": fname}
+            if df[col].dtype == object:
+                cat = pd.Categorical(df[col])
+                column["categories"] = cat.categories.tolist()
+                values = cat.codes
+            else:
+                values = df[col].to_numpy()
+            column["dtype"] = str(values.dtype)
+            np.save(os.path.join(path, fname), values)
+            columns.append(column)
+        manifest["frames"][name] = {"length": len(df), "columns": columns}
+
+    shared_data.write_file(
+        os.path.join(path, "manifest.json"),
+        lambda f: json.dump(manifest, f, indent=1),
+        "w",
+    )
+    return manifest
+
+
+def compact_frame(df):
+    """
+    compact copy of a prepared frame: strings as categoricals, floats as
+    float32, and integers (years) in the smallest integer type that fits
+    METRs stay float64; in float32 some of them would round to a different
+    third decimal in the tables
+    """
+    data = {}
+    for col in df.columns:
+        values = df[col]
+        if values.dtype == object:
+            values = values.astype("category")
+        elif values.dtype.kind == "f" and col not in METRICS:
+            values = values.astype(np.float32)
+        elif values.dtype.kind == "i":
+            values = pd.to_numeric(values, downcast="integer")
+        data[col] = values
+    return pd.DataFrame(data)
+
+
+def read_manifest(path):
+    """
+    manifest.json of the artifact in path, or None if there is none
+    """
+    try:
+        with open(os.path.join(path, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_prepared(path, checksum, compact=False):
+    """
+    load the frames of a prepared artifact, memory-mapping the column files
+    with compact=True the frames are stored as by compact_frame, and string
+    columns are built straight from their codes
+    returns None if the artifact is missing or was built from other inputs
+    """
+    manifest = read_manifest(path)
+    if manifest is None or manifest.get("checksum") != checksum:
+        return None
+
+    frames = {}
+    for name, frame in manifest["frames"].items():
+        data = {}
+        for column in frame["columns"]:
+            values = np.load(os.path.join(path, column["file"]), mmap_mode="r")
+            if "categories" in column and compact:
+                values = pd.Categorical.from_codes(values, column["categories"])
+            elif "categories" in column:
+                # code -1 (missing) picks the trailing NaN
+                categories = np.array(column["categories"] + [np.nan], dtype=object)
+                values = categories[values]
+            data[column["name"]] = values
+        frames[name] = pd.DataFrame(data)
+        if compact:
+            frames[name] = compact_frame(frames[name])
+    return frames
+
+
+def load_scenario(scenario, prepared_path=PREPARED_DATA_PATH, compact=False):
+    """
+    load the asset and industry frames of one scenario from its prepared
+    artifact, falling back to the CSV pipeline when it is missing or stale
+    with compact=True the frames are stored as by compact_frame
+    """
+    path = os.path.join(prepared_path, scenario["name"])
+    frames = read_prepared(path, source_checksum(scenario, prepared_path), compact)
+    if frames is None:
+        if os.path.exists(path):
+            warnings.warn(
+                "prepared data in {} is stale; run `python prepare.py` to "
+                "rebuild it".format(path)
+            )
+        frames = prepare_scenario(scenario)
+        if compact:
+            frames = tuple(compact_frame(df) for df in frames)
+        return frames
+    return frames["asset_df"], frames["industry_df"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prepare data for app.py")
+    parser.add_argument(
+        "--output",
+        default=PREPARED_DATA_PATH,
+        help="artifact directory (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--scenario",
+        action="append",
+        help="scenario to prepare (default: every scenario)",
+    )
+    args = parser.parse_args(argv)
+
+    scenarios = load_registry()["scenarios"]
+    for name in args.scenario or scenarios:
+        scenario = scenarios[name]
+        # taken before reading, so that a file changed meanwhile is rehashed
+        sources = source_stats(scenario)
+        asset_df, industry_df = prepare_scenario(scenario)
+        path = os.path.join(args.output, name)
+        manifest = write_prepared(
+            {"asset_df": asset_df, "industry_df": industry_df},
+            path,
+            source_checksum(scenario, args.output),
+            sources,
+        )
+        print("wrote {} (checksum {})".format(path, manifest["checksum"][:12]))
+
+
+if __name__ == "__main__":
+    main()
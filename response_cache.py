@@ -0,0 +1,158 @@
+"""
+Callback response cache for app.py shared by all worker processes
+
+With RESPONSE_CACHE_DIR set, the body of every successful
+/_dash-update-component response is stored in that directory under a
+hash of the callback's outputs, inputs, state, and changed inputs, so a
+worker can answer a request that any worker has already computed without
+running the callback or serializing its outputs again.
+
+Entries live in a subdirectory named after the data fingerprint, so
+responses built from other data or code are never served. invalidate()
+switches to a new fingerprint and removes the old entries.
+
+Each response carries the cache key as its ETag. Keys already cover the
+data, so a request whose If-None-Match matches its key gets a 304
+without a lookup.
+"""
+import hashlib
+import json
+import os
+import shutil
+import warnings
+
+import shared_data
+
+# shared directory of cached responses; unset disables the cache
+RESPONSE_CACHE_DIR = os.environ.get("RESPONSE_CACHE_DIR")
+# maximum number of cached responses for the current data
+RESPONSE_CACHE_SIZE = int(os.environ.get("RESPONSE_CACHE_SIZE", "10000"))
+
+# fingerprint of the data this process serves
+fingerprint = None
+
+
+def entry_dir():
+    return os.path.join(RESPONSE_CACHE_DIR, fingerprint)
+
+
+def request_key(body):
+    """
+    cache key of a callback request: a hash of the data fingerprint and
+    of the callback's outputs, inputs, and state, and of which inputs
+    changed, since the figure callback answers a change of the year alone
+    with a partial update
+    """
+    keys = ("output", "outputs", "inputs", "state", "changedPropIds")
+    request = {k: body.get(k) for k in keys}
+    h = hashlib.sha256(fingerprint.encode())
+    h.update(json.dumps(request, sort_keys=True, default=str).encode())
+    return h.hexdigest()
+
+
+def get(key):
+    """
+    cached response body for key, or None
+    """
+    try:
+        with open(os.path.join(entry_dir(), key), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def put(key, data):
+    """
+    store a response body; the file is written to a temporary name and
+    renamed so other workers and threads never read a partial response
+    """
+    path = entry_dir()
+    os.makedirs(path, exist_ok=True)
+    shared_data.write_file(os.path.join(path, key), lambda f: f.write(data))
+    if key.endswith("00"):
+        # every 256th write, on average, evicts the oldest entries
+        prune(path)
+
+
+def prune(path):
+    """
+    remove the least recently written entries beyond RESPONSE_CACHE_SIZE
+    temporary files of writes in progress are left alone, and entries
+    that other workers replace or remove meanwhile are skipped
+    """
+    entries = []
+    for entry in os.scandir(path):
+        if entry.name.endswith(".tmp"):
+            continue
+        try:
+            entries.append((entry.stat().st_mtime, entry.path))
+        except OSError:
+            # replaced or removed by another worker
+            pass
+    entries.sort()
+    for _, entry_path in entries[: max(0, len(entries) - RESPONSE_CACHE_SIZE)]:
+        try:
+            os.remove(entry_path)
+        except OSError:
+            # already removed by another worker
+            pass
+
+
+def invalidate(new_fingerprint):
+    """
+    serve responses for new_fingerprint and drop the entries of other
+    data, e.g. after the scenario files change
+    """
+    global fingerprint
+    if not RESPONSE_CACHE_DIR:
+        return
+    fingerprint = new_fingerprint
+    for name in os.listdir(RESPONSE_CACHE_DIR):
+        # only directories named like a fingerprint hold cached responses
+        stale = name != new_fingerprint and len(name) == len(new_fingerprint)
+        if stale and all(c in "0123456789abcdef" for c in name):
+            shutil.rmtree(os.path.join(RESPONSE_CACHE_DIR, name), ignore_errors=True)
+
+
+def register(server, data_fingerprint):
+    """
+    answer callback requests on the Flask server from the cache
+    """
+    if not RESPONSE_CACHE_DIR:
+        return
+    import flask
+
+    os.makedirs(RESPONSE_CACHE_DIR, exist_ok=True)
+    invalidate(data_fingerprint)
+
+    @server.before_request
+    def serve_cached():
+        if not flask.request.path.endswith("/_dash-update-component"):
+            return None
+        key = flask.g.response_key = request_key(flask.request.get_json())
+        if key in flask.request.if_none_match:
+            flask.g.response_cached = True
+            response = flask.Response(status=304)
+            response.set_etag(key)
+            return response
+        data = get(key)
+        if data is None:
+            return None
+        flask.g.response_cached = True
+        response = flask.Response(data, mimetype="application/json")
+        response.set_etag(key)
+        return response
+
+    @server.after_request
+    def store_response(response):
+        key = flask.g.pop("response_key", None)
+        if key is None or flask.g.pop("response_cached", False):
+            return response
+        if response.status_code == 200 and not response.direct_passthrough:
+            try:
+                put(key, response.get_data())
+            except OSError as e:
+                # the response is fine even when it cannot be cached
+                warnings.warn("could not cache a response: {}".format(e))
+            response.set_etag(key)
+        return response
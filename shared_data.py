@@ -0,0 +1,335 @@
+"""
+Scenario data shared by all worker processes through memory-mapped files
+
+With FRAME_STORAGE=shared, app.py stores the indexed data of each scenario
+once in a directory under SHARED_DATA_PATH, which defaults to /dev/shm so
+that the files live in shared memory. Every worker maps the files
+read-only instead of holding its own copy, so adding workers adds little
+memory for the data.
+
+Frames are stored column-wise in the layout pandas keeps them in: the
+columns of each numeric dtype as one 2-D array, and strings as
+categorical codes. Mapping them back builds frames whose values are views
+of the mapped arrays. A dict of partitions, as from app.make_index, is
+stored as one frame with the rows of the partitions in order, and each
+partition is mapped as a slice of it.
+
+The first process to need a scenario builds and writes it while holding a
+lock; the others wait and map what it wrote. With `gunicorn --preload`
+that is the master process, before the workers are forked.
+
+The other storage modes keep a private copy of the data in each process,
+which app.py lays out the same way with read_only_frame, read-only, so
+that the threads of a worker can share it.
+"""
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+import warnings
+
+from startup import lazy_import
+
+# numpy and pandas are imported on first use, when a scenario is loaded
+np = lazy_import("numpy")
+pd = lazy_import("pandas")
+
+# directory of the shared scenario data
+SHARED_DATA_PATH = os.environ.get(
+    "SHARED_DATA_PATH",
+    os.path.join(
+        "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(),
+        "ccc-widget",
+    ),
+)
+
+
+def write_array(path, name, values):
+    np.save(os.path.join(path, name + ".npy"), values)
+    return name + ".npy"
+
+
+def map_array(path, fname):
+    return np.load(os.path.join(path, fname), mmap_mode="r")
+
+
+def write_frame(path, name, df):
+    """
+    write the columns and index of df and return their spec
+    numeric columns are stacked into one array per dtype; object and
+    categorical columns are stored as codes into their categories; each
+    keeps the position of its first column
+    """
+    spec = {"blocks": [], "categoricals": []}
+    dtypes = {}
+    for i, col in enumerate(df.columns):
+        values = df.iloc[:, i]
+        if values.dtype == object or values.dtype.name == "category":
+            values = pd.Categorical(values)
+            spec["categoricals"].append(
+                {
+                    "name": col,
+                    "file": write_array(path, "{}.{}".format(name, i), values.codes),
+                    "dtype": values.dtype,
+                    "position": i,
+                }
+            )
+        else:
+            dtypes.setdefault(values.dtype, []).append(i)
+    for n, (dtype, positions) in enumerate(dtypes.items()):
+        values = np.stack([df.iloc[:, i].to_numpy() for i in positions])
+        spec["blocks"].append(
+            {
+                "columns": [df.columns[i] for i in positions],
+                "file": write_array(path, "{}.block{}".format(name, n), values),
+                "position": positions[0],
+            }
+        )
+    spec["index"] = write_frame_index(path, name, df.index)
+    return spec
+
+
+def write_frame_index(path, name, index):
+    if isinstance(index, pd.MultiIndex):
+        return {
+            "names": list(index.names),
+            "levels": write_frame(path, name + ".index", index.to_frame(index=False)),
+        }
+    return {
+        "name": index.name,
+        "file": write_array(path, name + ".index", index.to_numpy()),
+    }
+
+
+def frame_of_blocks(index, blocks):
+    """
+    frame on index whose values are views of the given arrays, in the
+    order given; blocks are (columns, 2-D array with one row per column)
+    or (column, Categorical)
+    """
+    frames = [
+        (
+            pd.DataFrame({columns: values}, index=index, copy=False)
+            if isinstance(values, pd.Categorical)
+            else pd.DataFrame(values.T, index=index, columns=columns, copy=False)
+        )
+        for columns, values in blocks
+    ]
+    if not frames:
+        return pd.DataFrame(index=index)
+    return pd.concat(frames, axis=1, copy=False)
+
+
+def map_frame(path, spec):
+    """
+    frame of a spec from write_frame whose values are views of the mapped
+    files
+    the columns are grouped by dtype, as stored, and the groups are put in
+    the order of their first columns, as by read_only_frame; splitting
+    the groups to put every column back in its place would copy them
+    """
+    blocks = [
+        (block["position"], block["columns"], map_array(path, block["file"]))
+        for block in spec["blocks"]
+    ]
+    blocks += [
+        (
+            column["position"],
+            column["name"],
+            pd.Categorical.from_codes(
+                map_array(path, column["file"]), dtype=column["dtype"]
+            ),
+        )
+        for column in spec["categoricals"]
+    ]
+    blocks.sort(key=lambda block: block[0])
+    index = map_frame_index(path, spec["index"])
+    return frame_of_blocks(index, [block[1:] for block in blocks])
+
+
+def read_only_frame(df):
+    """
+    copy of df laid out like map_frame, with the columns of each dtype in
+    one read-only array, which threads can share: reading it never
+    consolidates it in place, and writing to it raises
+    the groups of columns are in the order of their first column, so
+    columns keep their order when those of each dtype are next to each
+    other, as in the tables
+    object columns stay writable, since pandas cannot compare read-only
+    object arrays
+    """
+    blocks, dtypes = [], {}
+    for i, col in enumerate(df.columns):
+        values = df.iloc[:, i]
+        if values.dtype.name == "category":
+            codes = values.cat.codes.to_numpy().copy()
+            codes.flags.writeable = False
+            values = pd.Categorical.from_codes(codes, dtype=values.dtype)
+            blocks.append((i, col, values))
+        else:
+            dtypes.setdefault(values.dtype, []).append(i)
+    for dtype, positions in dtypes.items():
+        values = np.stack([df.iloc[:, i].to_numpy() for i in positions])
+        values.flags.writeable = dtype == object
+        blocks.append((positions[0], [df.columns[i] for i in positions], values))
+    blocks.sort(key=lambda block: block[0])
+    return frame_of_blocks(df.index, [block[1:] for block in blocks])
+
+
+def read_only(value):
+    """
+    value, which may nest frames and arrays in dicts like the data of
+    dump, with every frame replaced by a read_only_frame copy and every
+    numeric array made read-only
+    """
+    if isinstance(value, pd.DataFrame):
+        return read_only_frame(value)
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        value.flags.writeable = False
+        return value
+    if isinstance(value, dict):
+        return {key: read_only(item) for key, item in value.items()}
+    return value
+
+
+def map_frame_index(path, spec):
+    if "levels" in spec:
+        levels = map_frame(path, spec["levels"])
+        return pd.MultiIndex.from_frame(levels[spec["names"]])
+    return pd.Index(map_array(path, spec["file"]), name=spec["name"], copy=False)
+
+
+def is_partitions(value):
+    return (
+        isinstance(value, dict)
+        and len(value) > 0
+        and all(isinstance(part, pd.DataFrame) for part in value.values())
+    )
+
+
+def dump(path, name, value):
+    """
+    write the frames and arrays in value, which may be nested in dicts, and
+    return value with each of them replaced by its spec
+    """
+    if is_partitions(value):
+        parts, start = [], 0
+        for key, part in value.items():
+            parts.append((key, start, start + len(part)))
+            start += len(part)
+        frame = pd.concat(list(value.values()))
+        return {
+            "shared": "partitions",
+            "frame": write_frame(path, name, frame),
+            "parts": parts,
+        }
+    if isinstance(value, pd.DataFrame):
+        return {"shared": "frame", "frame": write_frame(path, name, value)}
+    if isinstance(value, np.ndarray) and value.dtype != object:
+        return {"shared": "array", "file": write_array(path, name, value)}
+    if isinstance(value, dict):
+        return {
+            key: dump(path, "{}.{}".format(name, key), item)
+            for key, item in value.items()
+        }
+    return value
+
+
+def load(path, value):
+    """
+    reverse of dump, mapping the files it wrote
+    """
+    if not isinstance(value, dict):
+        return value
+    kind = value.get("shared")
+    if kind == "partitions":
+        frame = map_frame(path, value["frame"])
+        return {key: frame.iloc[start:stop] for key, start, stop in value["parts"]}
+    if kind == "frame":
+        return map_frame(path, value["frame"])
+    if kind == "array":
+        return map_array(path, value["file"])
+    return {key: load(path, item) for key, item in value.items()}
+
+
+def read(path):
+    """
+    mapped data stored in path, or None if it has not been written
+    """
+    try:
+        with open(os.path.join(path, "manifest.pickle"), "rb") as f:
+            manifest = pickle.load(f)
+        return load(path, manifest)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def write_file(path, write, mode="wb"):
+    """
+    write a file with write(f) to a temporary name and rename it to path,
+    so other processes and threads never read a partial file
+    """
+    tmp_path = "{}.{}.{}.tmp".format(path, os.getpid(), threading.get_ident())
+    try:
+        with open(tmp_path, mode) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def write(path, data):
+    """
+    store data, a dict of frames, partitions, arrays and other picklable
+    values, in path
+    the files are written to a temporary directory that is renamed into
+    place, so other processes never map a partial write
+    """
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    try:
+        manifest = dump(tmp_path, "data", data)
+        with open(os.path.join(tmp_path, "manifest.pickle"), "wb") as f:
+            pickle.dump(manifest, f)
+        os.rename(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def get_or_build(name, key, build):
+    """
+    shared data of the scenario name built by build(), mapped from
+    SHARED_DATA_PATH; key identifies what the data was built from, and
+    data stored for other keys of the scenario is removed
+    when the data cannot be written, e.g. because the shared memory is
+    full, the data built by this process is returned instead
+    """
+    import fcntl
+
+    os.makedirs(SHARED_DATA_PATH, exist_ok=True)
+    path = os.path.join(SHARED_DATA_PATH, "{}-{}".format(name, key))
+    data = read(path)
+    if data is not None:
+        return data
+    with open(os.path.join(SHARED_DATA_PATH, name + ".lock"), "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        # another process may have written it while this one waited
+        data = read(path)
+        if data is not None:
+            return data
+        data = build()
+        try:
+            write(path, data)
+        except OSError as e:
+            warnings.warn("could not share the data of {}: {}".format(name, e))
+            return data
+        # processes that mapped the old files keep them until they let go
+        prefix = name + "-"
+        for entry in os.listdir(SHARED_DATA_PATH):
+            stale = entry.startswith(prefix) and entry != os.path.basename(path)
+            if stale and not entry.endswith(".tmp") and "-" not in entry[len(prefix) :]:
+                shutil.rmtree(os.path.join(SHARED_DATA_PATH, entry), ignore_errors=True)
+        return read(path) or data
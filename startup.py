@@ -0,0 +1,186 @@
+"""
+Startup helpers for app.py: deferred imports and a startup profile
+
+With STARTUP_PROFILE=1, importing app.py prints how long each startup
+phase took. Running this module profiles a fresh import of app.py,
+including the slowest imported packages, and exits with an error when
+startup exceeds the budget:
+
+    python startup.py [--budget SECONDS]
+"""
+
+import argparse
+import importlib.util
+import os
+import subprocess
+import sys
+import threading
+import time
+import warnings
+
+CURR_PATH = os.path.abspath(os.path.dirname(__file__))
+
+# print the phase timings once app.py is imported
+STARTUP_PROFILE = os.environ.get("STARTUP_PROFILE", "") not in ("", "0")
+# warn when importing app.py takes longer than this many seconds
+STARTUP_BUDGET = float(os.environ.get("STARTUP_BUDGET", "0")) or None
+
+# names of the modules imported by lazy_import
+lazy_modules = []
+lazy_modules_lock = threading.Lock()
+# (phase, seconds) in the order the phases ran
+phases = []
+start_time = last_checkpoint = time.perf_counter()
+
+
+def lazy_import(name):
+    """
+    import a module whose body only runs on first attribute access, so
+    heavy packages stay off the startup path until they are needed
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    lazy_modules.append(name)
+    return module
+
+
+def load_lazy_modules():
+    """
+    run the bodies of the modules imported by lazy_import that have not
+    been used yet; LazyLoader is not thread-safe before Python 3.12.3, so
+    every thread that starts using them before the app serves requests
+    from several threads calls this first
+    """
+    with lazy_modules_lock:
+        for name in lazy_modules:
+            getattr(sys.modules[name], "__name__")
+
+
+def checkpoint(name):
+    """
+    record the time since the previous checkpoint as startup phase name
+    """
+    global last_checkpoint
+    now = time.perf_counter()
+    phases.append((name, now - last_checkpoint))
+    last_checkpoint = now
+
+
+def rss_mb():
+    """
+    resident memory of this process in MB, or its peak where /proc is not
+    available
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def report():
+    """
+    text report of the phase timings, the total time since startup began,
+    and the resident memory
+    """
+    lines = ["{:<32} {:>8.3f}s".format(name, seconds) for name, seconds in phases]
+    lines.append("{:<32} {:>8.3f}s".format("total", time.perf_counter() - start_time))
+    lines.append("{:<32} {:>7.1f}MB".format("resident memory", rss_mb()))
+    return "\n".join(lines)
+
+
+def finish():
+    """
+    called at the end of app.py's import: print the profile if requested
+    and check the startup budget
+    """
+    total = time.perf_counter() - start_time
+    if STARTUP_PROFILE:
+        print(report(), file=sys.stderr)
+    if STARTUP_BUDGET is not None and total > STARTUP_BUDGET:
+        warnings.warn(
+            "app.py took {:.3f}s to start, over the {:.3f}s budget".format(
+                total, STARTUP_BUDGET
+            )
+        )
+
+
+def parse_importtime(stderr, module="app"):
+    """
+    cumulative import time in seconds of each module imported directly by
+    module, parsed from the output of python -X importtime, which lists
+    each import after the imports it triggered, indented two spaces per
+    level
+    """
+    children = {}
+    for line in stderr.splitlines():
+        fields = line[len("import time:") :].split("|")
+        if not line.startswith("import time:") or len(fields) != 3:
+            continue
+        try:
+            cumulative = int(fields[1]) / 1e6
+        except ValueError:
+            # column header
+            continue
+        name = fields[2].rstrip()
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 1:
+            children[name.strip()] = cumulative
+        elif depth == 0:
+            if name.strip() == module:
+                return children
+            children = {}
+    return children
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the startup of app.py")
+    parser.add_argument(
+        "--budget",
+        type=float,
+        default=STARTUP_BUDGET,
+        help="fail when importing app.py takes longer than this many seconds",
+    )
+    parser.add_argument("--top", type=int, default=10, help="packages to list")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, STARTUP_PROFILE="1")
+    env.pop("STARTUP_BUDGET", None)
+    t = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-W", "ignore", "-c", "import app"],
+        cwd=CURR_PATH,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    total = time.perf_counter() - t
+    if proc.returncode:
+        sys.exit(proc.stderr)
+
+    print("slowest imports")
+    imports = sorted(parse_importtime(proc.stderr).items(), key=lambda x: -x[1])
+    for name, seconds in imports[: args.top]:
+        print("  {:<30} {:>8.3f}s".format(name, seconds))
+    print("startup phases")
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            print("  " + line)
+    print("{:<32} {:>8.3f}s".format("process total", total))
+
+    if args.budget is not None and total > args.budget:
+        sys.exit(
+            "startup took {:.3f}s, over the {:.3f}s budget".format(total, args.budget)
+        )
+
+
+if __name__ == "__main__":
+    main()